@@ -6,6 +6,7 @@ import numpy as np
 import pyxel
 
 from map import Map
+from map_layer import MapLayer, MAP_IMAGE_BANK
 
 class State(Enum):
   START = 1 # 開始演出
@@ -41,6 +42,9 @@ class App:
         self.num_row_rooms = 4
         self.map.create_map_dungeon(num_col_rooms=self.num_col_rooms, num_row_rooms=self.num_row_rooms)
         self.map.set_goal()
+
+        # 地図は画像バンクに描いておいて, 変わったときだけ描き直す
+        self.map_layer = MapLayer({0: 5, -1: 8}, MAP_IMAGE_BANK)
         
         # 自キャラの初期化
         x = int(np.random.rand() * pyxel.width)
@@ -134,9 +138,10 @@ class App:
         # 最短経路の更新
         if not pyxel.frame_count % 15:
         
-            self.route = self.map.search_shortest_path_dws((self.enemy.y, self.enemy.x), (self.ego.y, self.ego.x))
-            self.route = deque(self.route)
-            self.route.popleft() # 一つ目はstartなので捨てる
+            route = self.map.search_shortest_path((self.enemy.y, self.enemy.x), (self.ego.y, self.ego.x))
+            if route is not None:
+                self.route = deque(route)
+                self.route.popleft() # 一つ目はstartなので捨てる
 
         if len(self.route) > 0:
             next_cell = self.route.popleft()
@@ -199,12 +204,7 @@ class App:
             
     def draw_map(self):
         # 迷路を描画
-        for i in range(self.map.w):
-            for j in range(self.map.h):
-                if self.map.data[j, i] == 0:
-                    pyxel.rect(i, j, 1, 1, 5)
-                if self.map.data[j, i] == -1:
-                    pyxel.rect(i, j, 1, 1, 8)
+        self.map_layer.draw(self.map, 0, 0)
         
     
 App()
\ No newline at end of file
@@ -6,6 +6,7 @@ import numpy as np
 import pyxel
 
 from city import City
+from map_layer import MapLayer, MAP_IMAGE_BANK
 
 class State(Enum):
   START = 1 # 開始演出
@@ -24,6 +25,7 @@ class Vehicle:
         
         self.dest = None # 目的地
         self.route = deque() # 走行経路
+        self.planner = None # 塞がれたときの再計画用. 目的地が変わったら捨てる
         
         self.waiting_time = 15 # [frames] ゴールに到着したらこれが0になるまで出発できない
         self.loaded = False # 積荷かどうか
@@ -32,6 +34,7 @@ class Vehicle:
     def reset(self):
         self.load_capacity = 100
         self.route = deque()
+        self.planner = None
 
     def update(self, _x, _y):
         self.x = _x
@@ -66,6 +69,12 @@ class App:
                                     min_room_size_ratio=0.2
                                     )
         self.map.set_start()
+
+        # 地図は画像バンクに描いておいて, 変わったときだけ描き直す
+        # 目的地番号は偶数が排土場, 奇数が積み込み場
+        colors = {0: 5, -2: 5, -1: 8} # FREE, START, GOAL
+        colors.update({i: 2 if i % 2 == 0 else 12 for i in range(2, 100)}) # DUMP, LOAD
+        self.map_layer = MapLayer(colors, MAP_IMAGE_BANK)
         
         # 自キャラの初期化
         self.num_vehicles = 4
@@ -76,7 +85,7 @@ class App:
             y = xy[0]
             v = Vehicle(x, y, 11)
             self.cars.append(v)
-            self.map.occupancuy[y, x] = True
+            self.map.occupy((y, x))
         
 
         for car in self.cars:        
@@ -121,6 +130,7 @@ class App:
                             car.dest = random.choice(list(self.map.dumpings.items())) # (idx, (y, x)) # キャラの目的地
                         else:   
                             car.dest = random.choice(list(self.map.loadings.items())) # (idx, (y, x)) # キャラの目的地
+                        car.planner = None
 
                         # 待ち時間を初期化
                         car.waiting_time = 15 # TODO: reset関数
@@ -172,27 +182,16 @@ class App:
 
     def draw_map(self):
         """地図を描画"""
-        for i in range(self.map.w):
-            for j in range(self.map.h):
-                ix = i
-                iy = j + self.header
-                if self.map.data[j, i] == 0 or self.map.data[j, i] == -2: # FREE and START
-                    pyxel.rect(ix, iy, 1, 1, 5)
-                if self.map.data[j, i] == -1: # GOAL
-                    pyxel.rect(ix, iy, 1, 1, 8)
-                if self.map.data[j, i] >= 2: # LOCATION
-                    if self.map.data[j, i] %2 == 0: # DUMP
-                        pyxel.rect(ix, iy, 1, 1, 2)
-                    elif self.map.data[j, i] %2 != 0: # LOAD                        
-                        pyxel.rect(ix, iy, 1, 1, 12)
+        self.map_layer.draw(self.map, 0, self.header)
     
     # 状態を更新する関数
     def act_target(self, car):
         # 最短経路の更新
         if len(car.route) == 0:        
-            car.route = self.map.search_shortest_path_dws((car.y, car.x), car.dest[1])
-            car.route = deque(car.route)
-            car.route.popleft() # 一つ目はstartなので捨てる
+            route = self.map.search_route_to_location((car.y, car.x), car.dest[0])
+            if route is not None:
+                car.route = deque(route)
+                car.route.popleft() # 一つ目はstartなので捨てる
 
         if len(car.route) > 0:
             next_cell = car.route.popleft()
@@ -201,13 +200,20 @@ class App:
             x = next_cell[1]
             y = next_cell[0]
             if self.map.occupancuy[y, x] == True:
-                car.route.appendleft(next_cell) # 戻す
+                # 回り道を探す. 前回の探索結果があれば変わったところだけ探し直す
+                if car.planner is None:
+                    car.planner = self.map.create_planner((car.y, car.x), car.dest[1])
+                route = self.map.replan(car.planner, (car.y, car.x))
+                if route is not None and len(route) > 1:
+                    car.route = deque(route[1:])
+                else:
+                    car.route.appendleft(next_cell) # 戻す
             else:
                 px = car.x
                 py = car.y
                 car.update(x, y)
-                self.map.occupancuy[y, x] = True
-                self.map.occupancuy[py, px] = False
+                self.map.occupy((y, x))
+                self.map.release((py, px))
                 
 
         else:
@@ -7,6 +7,7 @@ import numpy as np
 import pyxel
 
 from city import City
+from map_layer import MapLayer, MAP_IMAGE_BANK
 
 class State(Enum):
   START = 1 # 開始演出
@@ -49,6 +50,9 @@ class App:
                                     )
         
         self.real_size_map = copy.deepcopy(self.map.data )
+
+        # スモールマップは画像バンクに描いておいて, 変わったときだけ描き直す
+        self.map_layer = MapLayer({0: 5, -1: 8}, MAP_IMAGE_BANK)
         
         # 自キャラの初期化
         x = int(np.random.rand() * self.map.w)
@@ -382,14 +386,7 @@ class App:
 
 
         # スモールマップの描画
-        for i in range(self.map.w):
-            for j in range(self.map.h):
-                x = i
-                y = j + 15
-                if self.map.data[j, i] == 0:
-                    pyxel.rect(x, y, 1, 1, 5)
-                if self.map.data[j, i] == -1:
-                    pyxel.rect(x, y, 1, 1, 8)
+        self.map_layer.draw(self.map, 0, 15)
 
         pyxel.rect(self.ego.x, self.ego.y + 15, 1, 1, 11)
         pyxel.rectb(self.ego.x-8, self.ego.y-8 + 15, 16, 16, 8)
@@ -6,7 +6,8 @@ from collections import deque
 import numpy as np
 import pyxel
 
-from maze import Maze
+from world import ChunkedWorld, ChunkedMask
+import sprites
 
 class State(Enum):
   START = 1 # 開始演出
@@ -24,6 +25,18 @@ class Direction(Enum):
     DOWNLEFT=6,
     LEFT=7,
     UPLEFT=8
+
+# 向きごとのコマ (u, v, w, h). 下向きだけ2コマ
+VEHICLE_FRAMES = {
+    Direction.DOWN: [(16*0, 0, 16, 16), (16*8, 0, 16, 16)],
+    Direction.UP: [(16*1, 0, 16, 16)],
+    Direction.RIGHT: [(16*2, 0, 16, 16)],
+    Direction.LEFT: [(16*3, 0, 16, 16)],
+    Direction.DOWNRIHGHT: [(16*4, 0, 16, 16)],
+    Direction.DOWNLEFT: [(16*5, 0, 16, 16)],
+    Direction.UPLEFT: [(16*6, 0, 16, 16)],
+    Direction.UPRIGHT: [(16*7, 0, 16, 16)],
+}
     
 class Vehicle:
     def __init__(self, _x, _y, _c, _d=Direction.UP):
@@ -52,27 +65,29 @@ class App:
         # タイミング
         self.tick = 0 
 
-        # 地図
-        self.map = Maze(128, 64)
-        self.num_col_rooms = 4
-        self.num_row_rooms = 3
-        self.corrider_width = 1
-        self.map.create_map_dungeon(num_col_rooms=self.num_col_rooms, 
-                                    num_row_rooms=self.num_row_rooms,
-                                    corrider_width=self.corrider_width,
-                                    max_room_size_ratio=0.8,
-                                    min_room_size_ratio=0.2
+        # 地図. 端のない世界をチャンクに分け、近づいたところだけつくる
+        # 遠くなったチャンクは捨てるので、どこまで走ってもメモリは増えない
+        self.num_col_rooms = 2
+        self.num_row_rooms = 2
+        self.map = ChunkedWorld(chunk_size=64, seed=0, max_chunks=64,
+                                num_col_rooms=self.num_col_rooms,
+                                num_row_rooms=self.num_row_rooms,
+                                max_room_size_ratio=0.8,
+                                min_room_size_ratio=0.2
         )
 
-        # 見たことある場所
-        self.is_seen = np.zeros((self.map.h, self.map.w), dtype=bool)
+        # 自車両の絵
+        self.vehicle_sprite = sprites.Sprite(VEHICLE_FRAMES)
+
+        # 見たことある場所. 世界と同じくチャンクごとに持つ
+        self.is_seen = ChunkedMask(chunk_size=64)
         
         # 自キャラの初期化, map.dataの16倍の位置
-        yx = self.map.get_free_space(num=1)
+        yx = self.map.get_free_space(num=1)[0]
         self.ego = Vehicle(yx[1]*16, yx[0]*16, 11, Direction.UP) 
 
         # 自車両中心で描画可能な範囲だけを取り出しち地図と、その左右上下のマージン
-        self.local_data, self.margins = self.map.get_local_data(self.ego.y, self.ego.x)
+        self.local_data, self.margins = self.map.get_local_data(int(self.ego.y/16), int(self.ego.x/16))
 
         # 実行        
         pyxel.run(self.update, self.draw)
@@ -83,12 +98,12 @@ class App:
         """
 
 
-        # 画面内に表示される分だけのローカル地図
-        self.local_data, self.margins = self.map.get_local_data(self.ego.y, self.ego.x)
-        
         # 自キャラの操作うけつけ
         self.move_target(self.ego)
 
+        # 画面内に表示される分だけのローカル地図. 必要なチャンクはここでつくられる
+        self.local_data, self.margins = self.map.get_local_data(int(self.ego.y/16), int(self.ego.x/16))
+
         # 画面上での自キャラの位置
         # 基本は画面中央で、画面端のときだけ視覚中央からはずれる
         self.ego_vx = self.margins[0] * 16 
@@ -98,10 +113,7 @@ class App:
         cx = int(self.ego.x/16.)
         cy = int(self.ego.y/16.)
         lsmx, rsmx, usmy, dsmy = self.margins
-        for i in range(self.map.w):
-            for j in range(self.map.h):                
-                if cx - lsmx < i < cx + rsmx and cy - usmy < j < cy + dsmy:
-                    self.is_seen[j, i] = True
+        self.is_seen.set_window(cy - usmy + 1, cy + dsmy, cx - lsmx + 1, cx + rsmx)
 
         # トラック静止中の上下振動描画用時計        
         if pyxel.frame_count%5 == 0:
@@ -128,64 +140,29 @@ class App:
         # self.draw_vehicle(self.ego_vx, self.ego_vy)        
                  
         # スモールマップの描画みたことあるところだけ描画
+        # 世界に端がないので、自キャラのまわりsmap_sizeマスだけ描く
         smap_margin = 15 # [pix]
-        for i in range(self.map.w):
-            for j in range(self.map.h):                                                
-                x = i + smap_margin
-                y = j + smap_margin   
-                if self.map.data[j, i] == 0:
-                    if self.is_seen[j, i] == True:
-                        pyxel.rect(x, y, 1, 1, 5)
-                    else:
-                        pass
-                        # pyxel.rect(x, y, 1, 1, 12)
+        smap_size = 64 # [マス]
+        cx = int(self.ego.x/16)
+        cy = int(self.ego.y/16)
+        y0 = cy - smap_size // 2
+        x0 = cx - smap_size // 2
+        data = self.map.get_window(y0, y0 + smap_size, x0, x0 + smap_size)
+        is_seen = self.is_seen.get_window(y0, y0 + smap_size, x0, x0 + smap_size)
+        ys, xs = np.nonzero(is_seen & (data == 0))
+        for j, i in zip(ys.tolist(), xs.tolist()):
+            pyxel.rect(i + smap_margin, j + smap_margin, 1, 1, 5)
 
         # スモールマップの自キャラと視野範囲の描画
-        _, self.margins = self.map.get_local_data(self.ego.y, self.ego.x)
         lsmx, rsmx, usmy, dsmy = self.margins
-        cx = int(self.ego.x/16)
-        cy = int(self.ego.y/16)
-        pyxel.rect (cx + smap_margin, cy + smap_margin, 1,  1, 11)
-        pyxel.rectb(cx - lsmx + smap_margin, cy - usmy + 15, 16, 16, 8)
+        pyxel.rect (cx - x0 + smap_margin, cy - y0 + smap_margin, 1,  1, 11)
+        pyxel.rectb(cx - x0 - lsmx + smap_margin, cy - y0 - usmy + 15, 16, 16, 8)
 
         # ゲームタイトルの描画            
         pyxel.text(5, 5, self.name,  7)            
 
     def draw_vehicle(self, x, y):
-        bltx = 0
-        blty = 0
-        bltw = 16
-        blth = 16
-        if self.ego.d == Direction.DOWN:
-            if self.tick % 2 == 0:
-                bltx = 16*0
-            else:
-                bltx = 16*8
-            blty = 0
-        elif self.ego.d == Direction.UP:
-            bltx = 16*1
-            blty = 0
-        elif self.ego.d == Direction.RIGHT:
-            bltx = 16*2
-            blty = 0
-        elif self.ego.d == Direction.LEFT:
-            bltx = 16*3
-            blty = 0
-        elif self.ego.d == Direction.DOWNRIHGHT:
-            bltx = 16*4
-            blty = 0
-        elif self.ego.d == Direction.DOWNLEFT:
-            bltx = 16*5 
-            blty = 0
-        elif self.ego.d == Direction.UPLEFT:
-            bltx = 16*6 
-            blty = 0
-        elif self.ego.d == Direction.UPRIGHT:
-            bltx = 16*7 
-            blty = 0
-            
-        pyxel.blt(x, y, 0, bltx, blty, bltw, blth)
-
+        self.vehicle_sprite.draw(x, y, self.ego.d, self.tick)
 
     def move_target(self, target):
         x = target.x
@@ -1,4 +1,3 @@
-import copy
 import random
 from enum import Enum
 from collections import deque
@@ -7,6 +6,11 @@ import numpy as np
 import pyxel
 
 from maze import Maze
+import search
+from floor import FloorPrefetcher
+from minimap import Minimap
+from map_layer import MAP_IMAGE_BANK
+import sprites
 from tile import *
 
 class State(Enum):
@@ -36,9 +40,14 @@ exp_table = {}
 for lv in range(1, 100):
     exp_table[lv] = int(lv**2*1.5) + 4
 
-def draw_tile(x, y, tile_type):
-    txy = get_tile_loc(tile_type)
-    pyxel.blt(x, y, 0, txy[0], txy[1], 16, 16)
+# 歩くキャラの向きごとのコマ (u, v, w, h). u, vはキャラごとの左上からのずれ
+# 右向きは左向きの絵を反転して使う
+WALK_FRAMES = {
+    Direction.UP: [(16, 0, 16, 16), (16, 16, 16, 16)],
+    Direction.RIGHT: [(32, 0, -16, 16), (32, 16, -16, 16)],
+    Direction.DOWN: [(0, 0, 16, 16), (0, 16, 16, 16)],
+    Direction.LEFT: [(32, 0, 16, 16), (32, 16, 16, 16)],
+}
 
     
 class Man:
@@ -113,11 +122,11 @@ class Man:
         self.alive = False
 
 class Enemy(Man):
-    def __init__(self, _x, _y, _c, _d=Direction.UP, hitpoints=10, max_hitpoints=10, exp=5):
+    def __init__(self, _x, _y, _c, _d=Direction.UP, hitpoints=10, max_hitpoints=10, exp=5, id=None):
         super().__init__(_x, _y, _c, _d=_d, hitpoints=hitpoints, max_hitpoints=max_hitpoints)
         self.route = None
         self.exp = exp
-        self.id = np.random.randint(0,3)
+        self.id = np.random.randint(0,3) if id is None else id
         
     def set_route(self, _route):
         self.route = _route
@@ -133,6 +142,25 @@ class App:
         self.state = State.START
         self.turn = Turn.EGO
 
+        # 地図の設定
+        # seedを決めると毎回同じフロアと敵になる. Noneなら毎回違う
+        self.seed = None
+        self.rng = np.random.default_rng(self.seed)
+        self.num_col_rooms = 3
+        self.num_row_rooms = 2
+        self.corrider_width = 1
+        self.num_enemies = int(self.rng.integers(2, 5))
+
+        # 次のフロアは別プロセスでつくる. プロセスはpyxel.initより前に立ち上げる
+        self.floor_prefetcher = FloorPrefetcher(Maze, 64, 48,
+                                    num_col_rooms=self.num_col_rooms,
+                                    num_row_rooms=self.num_row_rooms,
+                                    corrider_width=self.corrider_width,
+                                    max_room_size_ratio=0.8,
+                                    min_room_size_ratio=0.2
+        )
+        self.floor_prefetcher.prefetch(self.num_enemies, seed=int(self.rng.integers(2**31 - 1)))
+
         # ゲームの設定
         pyxel.init(256, 256, caption=self.name, scale=2, fps=15)# , palette=palette)
         pyxel.load("my_resource.pyxres")
@@ -147,6 +175,9 @@ class App:
         # 画面切り替え時間
         self.change_view_timer = 13# [frames] 1secくらいまつ    
         self.change_turn_timer = 6# [frames]    
+
+        # 敵がこれより遠ければ追いかけてこない
+        self.chase_radius = 20 # [マス]
         
 
         # フロア
@@ -156,33 +187,28 @@ class App:
         self.tick = 0 
 
         # 地図
-        self.map = Maze(64, 48)
-        self.num_col_rooms = 3
-        self.num_row_rooms = 2
-        self.corrider_width = 1
-        self.map.create_map_dungeon(num_col_rooms=self.num_col_rooms, 
-                                    num_row_rooms=self.num_row_rooms,
-                                    corrider_width=self.corrider_width,
-                                    max_room_size_ratio=0.8,
-                                    min_room_size_ratio=0.2
-        )
-        self.map.set_goal()
+        floor = self.floor_prefetcher.get(self.num_enemies)
+        self.map = floor["map"]
+        self.floor_tile_map = floor["tile_map"] # 壁のタイルはフロアをつくるときに決めてある
 
         # 見たことある場所
         self.is_seen = np.zeros((self.map.h, self.map.w), dtype=bool)
         self.occupancy = np.zeros((self.map.h, self.map.w), dtype=bool) # キャラとかアイテムがある場所
+
+        # スモールマップ. 見たことある通路を描きためておく
+        self.minimap = Minimap(MAP_IMAGE_BANK)
+        self.tile_table = sprites.TileTable(sprites.get_tile_locs(get_tile_loc, TyleType))
+        self.walk_sprite = sprites.Sprite(WALK_FRAMES, colkey=0)
         
         # 自キャラの初期化, map.dataの16倍の位置
-        yx = self.map.get_free_space(num=1)
+        yx = floor["ego"]
         self.ego = Man(yx[1], yx[0], 11, Direction.UP, hitpoints=50, max_hitpoints=50) 
         self.occupancy[yx[0], yx[1]] = True
 
         # 敵キャラの配置
-        self.num_enemies = np.random.randint(2, 5)
         self.enemies = []
-        for _ in range(self.num_enemies):
-            yx = self.map.get_free_space(num=1)
-            enemy = Enemy(yx[1], yx[0], 14, Direction.UP, hitpoints=9, max_hitpoints=9) 
+        for yx in floor["enemies"]:
+            enemy = Enemy(yx[1], yx[0], 14, Direction.UP, hitpoints=9, max_hitpoints=9, id=int(self.rng.integers(0, 3))) 
             enemy.set_route(deque())
             self.enemies.append(enemy)
             self.occupancy[yx[0], yx[1]] = True
@@ -200,83 +226,23 @@ class App:
             ene.vy = self.ego.vy + (ene.y - self.ego.y) * 16
 
         
+        # 次のフロアをつくりはじめる
+        self.floor_prefetcher.prefetch(self.num_enemies, seed=int(self.rng.integers(2**31 - 1)))
+
         # 実行        
         pyxel.run(self.update, self.draw)
 
     def create_tile_map(self):        
         """
-        local_mapに大してtile_infoを作成する        
+        フロア全体のtile_infoから画面に映る分だけ切り出す. コピーはしない
         """
+        lsmx, rsmx, usmy, dsmy = self.margins
+        h, w = self.floor_tile_map.shape
+        # 負の位置で反対側から切り出したり、端で16マスより短くならないように地図の中に収める
+        y0 = max(0, min(int(self.ego.y) - usmy, h - 16))
+        x0 = max(0, min(int(self.ego.x) - lsmx, w - 16))
+        self.tile_info_map = self.floor_tile_map[y0:y0+16, x0:x0+16]
 
-        self.tile_info_map = copy.deepcopy(self.local_data)*0
-        local_data = copy.deepcopy(self.local_data)
-        w = self.tile_info_map.shape[1]
-        h = self.tile_info_map.shape[0]
-    
-        # goalを見つける
-        goal_yx = list(zip(*np.where(local_data==-1)))
-        if len(goal_yx) == 1:
-            yx = goal_yx[0]
-            self.tile_info_map[yx[0], yx[1]] = 23 # GOAL
-
-            # Goalを消した地図の用意
-            local_data[yx[0], yx[1]] = 0
-
-        # y方向に微分して境目を見つける
-        for iy in range(h-1):
-            line = local_data[iy+1, :] - local_data[iy, :]
-            # 壁から通路なら-1, 通路から壁なら1
-            for ix, e in enumerate(line):
-                if e == -1:                    
-                    self.tile_info_map[iy, ix] = 1
-                if e == 1:                    
-                    self.tile_info_map[iy+1, ix] = 2
-
-        # x方向に微分して境目を見つける
-        for ix in range(w-1):
-            line = local_data[:, ix+1] - local_data[:, ix]
-            # 壁から通路なら-1, 通路から壁なら1
-            for iy, e in enumerate(line):
-                if e == -1:                    
-                    self.tile_info_map[iy, ix] = 3
-                if e == 1:                    
-                    self.tile_info_map[iy, ix+1] = 4
-        
-        srcs = [
-            np.array([[0,1],[3, 0]]),
-            np.array([[3,0],[0, 2]]),
-            np.array([[1,0],[0, 4]]),
-            np.array([[0,4],[2, 0]]),
-            np.array([[4,2],[4, 0]]),            
-            np.array([[4,0],[4, 1]]),            
-            np.array([[2,3],[0, 3]]),
-            np.array([[0,3],[1, 3]]),
-
-        ]
-        
-        dsts = [
-            np.array([[5,1],[3, 0]]),
-            np.array([[3,0],[6, 2]]),
-            np.array([[1,7],[0, 4]]),
-            np.array([[0,4],[2, 8]]),
-            np.array([[13,2],[4, 0]]),
-            np.array([[4,0],[14, 1]]),            
-            np.array([[2,15],[0, 3]]),
-            np.array([[0,3],[1, 16]]),                        
-        ]
-
-        for src, dst in zip(srcs, dsts):
-            tile_info_map_copy = copy.deepcopy(self.tile_info_map)
-            for iy in range(h-1):
-                for ix in range(w-1):
-                    diff = self.tile_info_map[iy:iy+2, ix:ix+2] - src                
-                    if np.all(diff == 0):
-                        tile_info_map_copy[iy:iy+2, ix:ix+2] = dst
-            self.tile_info_map = copy.deepcopy(tile_info_map_copy)
-
-
-
-        
     def update(self):
         """
         状態を変更する関数。毎フレーム呼ばれる。
@@ -351,6 +317,10 @@ class App:
             if self.turn == Turn.ENEMY:
 
                 # 敵キャラの行動
+                # 追いかけてくる敵の経路はターンごとにまとめて1回で求める
+                # 自キャラまでの歩数はどの敵でも同じなので探索は1回で、追いかけてくる範囲だけ見ればよい
+                self.enemy_routes = self.search_enemy_routes()
+
                 # TODO 順番にうごいてほしい                
                 for enemy in self.enemies:
                     if enemy.hitpoints > 0:
@@ -376,10 +346,11 @@ class App:
             cx = int(self.ego.x)
             cy = int(self.ego.y)
             lsmx, rsmx, usmy, dsmy = self.margins
-            for i in range(self.map.w):
-                for j in range(self.map.h):                
-                    if cx - lsmx < i < cx + rsmx and cy - usmy < j < cy + dsmy:
-                        self.is_seen[j, i] = True
+            y0, y1 = max(cy - usmy + 1, 0), cy + dsmy
+            x0, x1 = max(cx - lsmx + 1, 0), cx + rsmx
+            self.is_seen[y0:y1, x0:x1] = True
+            # スモールマップには新しく見えたところだけ描き足す
+            self.minimap.reveal(self.map, self.is_seen, y0, y1, x0, x1)
 
             # 描画用時計        
             if pyxel.frame_count%5 == 0:
@@ -413,31 +384,26 @@ class App:
             
             self.change_view_timer = 13 # 初期化
 
-            self.map.create_map_dungeon(num_col_rooms=self.num_col_rooms, 
-                                    num_row_rooms=self.num_row_rooms,
-                                    corrider_width=self.corrider_width,
-                                    max_room_size_ratio=0.8,
-                                    min_room_size_ratio=0.2
-            )
-            
-            self.map.set_goal()
+            # 先につくっておいたフロアに入れ替える
+            floor = self.floor_prefetcher.get(self.num_enemies)
+            self.map = floor["map"]
+            self.floor_tile_map = floor["tile_map"]
+            self.floor_prefetcher.prefetch(self.num_enemies, seed=int(self.rng.integers(2**31 - 1)))
 
             # 見たことある場所
             self.is_seen = np.zeros((self.map.h, self.map.w), dtype=bool)
             self.occupancy = np.zeros((self.map.h, self.map.w), dtype=bool) # キャラとかアイテムがある場所
             
             # 自キャラの初期化, map.dataの16倍の位置
-            yx = self.map.get_free_space(num=1)
+            yx = floor["ego"]
             self.ego.update(yx[1], yx[0])
             self.occupancy[yx[0], yx[1]] = True
         
             # 敵キャラの配置
             self.enemies = []
-            self.num_enemies
-            for _ in range(self.num_enemies):
-                yx = self.map.get_free_space(num=1)
+            for yx in floor["enemies"]:
                 self.occupancy[yx[0], yx[1]] = True
-                enemy = Enemy(yx[1], yx[0], 14, Direction.UP) 
+                enemy = Enemy(yx[1], yx[0], 14, Direction.UP, id=int(self.rng.integers(0, 3))) 
                 enemy.set_route(deque())
                 self.enemies.append(enemy)
 
@@ -571,16 +537,7 @@ class App:
 
         # スモールマップの描画みたことあるところだけ描画
         smap_margin = 15 # [pix]
-        for i in range(self.map.w):
-            for j in range(self.map.h):                                                
-                x = i + smap_margin
-                y = j + smap_margin   
-                if self.map.data[j, i] == 0:
-                    if self.is_seen[j, i] == True:
-                        pyxel.rect(x, y, 1, 1, 5)
-                    else:
-                        pass
-                        # pyxel.rect(x, y, 1, 1, 12)
+        self.minimap.draw(smap_margin, smap_margin)
 
         # スモールマップの自キャラと視野範囲の描画
         _, self.margins = self.map.get_local_data(self.ego.y, self.ego.x)
@@ -637,33 +594,7 @@ class App:
                 enemy.attacked = False
                 enemy.attack_motion_timer = 3 # [frames]
          
-        x = enemy.vx
-        y = enemy.vy   
-        if enemy.d == Direction.UP:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, u + 16, v, 16, 16, 0)
-            else:
-                pyxel.blt(x, y, 0, u + 16, v + 16, 16, 16, 0)
-
-        elif enemy.d == Direction.RIGHT:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, u + 32, v, -16, 16, 0)
-            else:
-                pyxel.blt(x, y, 0, u + 32, v + 16, -16, 16, 0)
-            
-        elif enemy.d == Direction.DOWN:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, u, v, 16, 16, 0)
-            else:
-                pyxel.blt(x, y, 0, u, v + 16, 16, 16, 0)
-
-        elif enemy.d == Direction.LEFT:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, u + 32, v, 16, 16, 0)
-            else:
-                pyxel.blt(x, y, 0, u + 32, v + 16, 16, 16, 0)
-
-        
+        self.walk_sprite.draw(enemy.vx, enemy.vy, enemy.d, self.tick, u, v)
 
         # HPの表示
         # pyxel.text(enemy.vx, enemy.vy-5, f"{enemy.hitpoints}/{enemy.max_hp}", 7)
@@ -730,115 +661,26 @@ class App:
 
 
     def draw_map(self):
-        # 地図の描画
-        for i in range(16):
-            for j in range(16):
-                x = i * 16
-                y = j * 16
-                
-                tile_type = self.tile_info_map[j, i]
-                if tile_type == 1:
-                    draw_tile(x, y, TyleType.WALL_IN_UP)
-
-                elif tile_type == 2:
-                    draw_tile(x, y, TyleType.WALL_IN_DOWN)
-                    
-                elif tile_type == 3:
-                    draw_tile(x, y, TyleType.WALL_IN_LEFT)
-
-                elif tile_type == 4:
-                    draw_tile(x, y, TyleType.WALL_IN_RIGHT)
-                
-                elif tile_type == 5:
-                    draw_tile(x, y, TyleType.WALL_IN_UL_CORNER)
-
-                elif tile_type == 6:
-                    draw_tile(x, y, TyleType.WALL_IN_DL_CORNER)
-
-                elif tile_type == 7:
-                    draw_tile(x, y, TyleType.WALL_IN_UR_CORNER)
-
-                elif tile_type == 8:
-                    draw_tile(x, y, TyleType.WALL_IN_DR_CORNER)
-                # -----
-                elif tile_type == 9:
-                    draw_tile(x, y, TyleType.WALL_OUT_UP)
-
-                elif tile_type == 10:
-                    draw_tile(x, y, TyleType.WALL_OUT_DOWN)
-
-                elif tile_type == 11:
-                    draw_tile(x, y, TyleType.WALL_OUT_LEFT)
-
-                elif tile_type == 12:
-                    draw_tile(x, y, TyleType.WALL_OUT_RIGHT)
-
-                elif tile_type == 13:
-                    draw_tile(x, y, TyleType.WALL_OUT_UL_CORNER)
-
-                elif tile_type == 14:
-                    draw_tile(x, y, TyleType.WALL_OUT_DL_CORNER)
-
-                elif tile_type == 15:
-                    draw_tile(x, y, TyleType.WALL_OUT_UR_CORNER)
-
-                elif tile_type == 16:
-                    draw_tile(x, y, TyleType.WALL_OUT_DR_CORNER)
-                    
-                # elif tile_type == 17:
-                #     draw_tile(x, y, TyleType.WALL_CORRIDER_H_CENTER)
-
-                # elif tile_type == 18:
-                #     draw_tile(x, y, TyleType.WALL_CORRIDER_V_CENTER)
-
-                # elif tile_type == 19:
-                #     draw_tile(x, y, TyleType.WALL_CORRIDER_LEFT)
-                    
-                # elif tile_type == 20:
-                #     draw_tile(x, y, TyleType.WALL_CORRIDER_RIGHT)
-                    
-                # elif tile_type == 21:
-                #     draw_tile(x, y, TyleType.WALL_CORRIDER_UP)
-                # elif tile_type == 22:
-                #     draw_tile(x, y, TyleType.WALL_CORRIDER_DOWN)
-                    
-                elif tile_type == 23:
-                    draw_tile(x, y, TyleType.GOAL)
-                
-                else:
-                    pass
-
+        # 地図の描画. 画面のタイルをまとめて描く
+        self.tile_table.draw(self.tile_info_map)
 
     def draw_warrior(self, x, y):
-        bltx = 0
-        blty = 0
-        bltw = 16
-        blth = 16
-
-        if self.ego.d == Direction.UP:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, 112, 64, 16, 16,0)
-            else:
-                pyxel.blt(x, y, 0, 112, 80, 16, 16,0)
-
-        elif self.ego.d == Direction.RIGHT:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, 128, 64, -16, 16,0)
-            else:
-                pyxel.blt(x, y, 0, 128, 80, -16, 16,0)
-            
-        elif self.ego.d == Direction.DOWN:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, 96, 64, 16, 16,0)
-            else:
-                pyxel.blt(x, y, 0, 96, 80, 16, 16,0)
-
-        elif self.ego.d == Direction.LEFT:
-            if self.tick %2 == 0:
-                pyxel.blt(x, y, 0, 128, 64, 16, 16,0)
-            else:
-                pyxel.blt(x, y, 0, 128, 80, 16, 16,0)
+        self.walk_sprite.draw(x, y, self.ego.d, self.tick, 96, 64)
 
+    def search_enemy_routes(self):
+        """
+        追いかけてくる範囲にいる敵の自キャラまでの経路 {id(enemy): route}
+        ほかのキャラのいるマスは通らない
+        """
+        cy = int(self.ego.y)
+        cx = int(self.ego.x)
+        chasers = [enemy for enemy in self.enemies
+                   if enemy.hitpoints > 0 and np.sqrt((enemy.x - cx)**2 + (enemy.y - cy)**2) <= self.chase_radius]
+        routes = search.search_many_bounded(self.map.data,
+                                            [(enemy.y, enemy.x) for enemy in chasers],
+                                            [(cy, cx)] * len(chasers),
+                                            (cy, cx), self.chase_radius, occupancy=self.occupancy)
+        return {id(enemy): route for enemy, route in zip(chasers, routes)}
 
     def act_enemy(self, enemy):
         
@@ -850,10 +692,11 @@ class App:
         # 最短経路の更新
         if not pyxel.frame_count % 1:            
             distance = np.sqrt((enemy.x - self.ego.x)**2 + (enemy.y - self.ego.y)**2)
-            if distance <= 20:
-                enemy.route = self.map.search_shortest_path_dws((ey, ex), (cy, cx))
-                enemy.route = deque(enemy.route)
-                enemy.route.popleft() # 一つ目はstartなので捨てる
+            if distance <= self.chase_radius:
+                route = self.enemy_routes.get(id(enemy))
+                if route is not None:
+                    enemy.route = deque(route)
+                    enemy.route.popleft() # 一つ目はstartなので捨てる
                 # enemy.route.pop() # 最後は自分キャラ
             
         if len(enemy.route) > 0:
@@ -965,4 +808,6 @@ class App:
         target.update(mx, my)
         self.occupancy[target.y, target.x] = True # 占有
 
-App()
\ No newline at end of file
+# 別プロセスで読みこまれたときにゲームを起動しないようにする
+if __name__ == "__main__":
+    App()
\ No newline at end of file
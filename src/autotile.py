@@ -0,0 +1,177 @@
+"""
+壁のタイルの種類を配列全体でまとめて決める
+各マスのまわりの並びを小さな整数(ビットマスク)にして、前もってつくった表を引くだけにする
+
+タイルの番号は TyleType の値と同じ
+    1~4: WALL_IN_UP, DOWN, LEFT, RIGHT
+    5~8: WALL_IN_UL, DL, UR, DR_CORNER
+    13~16: WALL_OUT_UL, DL, UR, DR_CORNER
+    23: GOAL (create_tile_mapのみ)
+"""
+import numpy as np
+
+# ---- 04_exampleのfind_tile_type ----
+
+# 2x2の並び[[左上, 右上], [左下, 右下]]と、そのときのタイル
+# 上にあるものから順に調べ、後のもので上書きする
+WALL_PATTERNS = [
+    ([[1, 1], [0, 0]], 1), # WALL_IN_UP
+    ([[0, 0], [1, 1]], 2), # WALL_IN_DOWN
+    ([[1, 0], [1, 0]], 3), # WALL_IN_LEFT
+    ([[0, 1], [0, 1]], 4), # WALL_IN_RIGHT
+    ([[1, 1], [1, 0]], 5), # WALL_IN_UL_CORNER
+    ([[1, 0], [1, 1]], 6), # WALL_IN_DL_CORNER
+    ([[1, 1], [0, 1]], 7), # WALL_IN_UR_CORNER
+    ([[0, 1], [1, 1]], 8), # WALL_IN_DR_CORNER
+    ([[0, 0], [0, 1]], 13), # WALL_OUT_UL_CORNER
+    ([[0, 1], [0, 0]], 14), # WALL_OUT_DL_CORNER
+    ([[0, 0], [1, 0]], 15), # WALL_OUT_UR_CORNER
+    ([[1, 0], [0, 0]], 16), # WALL_OUT_DR_CORNER
+]
+
+# 窓の左下に置くタイル. それ以外は左上に置く
+LOWER_TILES = [2, 6, 8, 14, 16]
+
+def get_quad_masks(data):
+    """
+    各マスを左上とする2x2の窓を 左上 | 右上<<1 | 左下<<2 | 右下<<3 にする. 0, 1以外を含む窓は16
+    右端と下端の窓ははみ出した分を端のマスで埋める (もとの実装で切れた窓を比べていたのと同じ)
+    """
+    data = np.asarray(data)
+    pad = np.pad(data, ((0, 1), (0, 1)), mode="edge")
+    quad = [pad[:-1, :-1], pad[:-1, 1:], pad[1:, :-1], pad[1:, 1:]]
+    masks = np.zeros(data.shape, dtype=np.uint8)
+    valid = np.ones(data.shape, dtype=bool)
+    for bit, q in enumerate(quad):
+        valid &= (q == 0) | (q == 1)
+        masks |= (q == 1).astype(np.uint8) << bit
+    masks[~valid] = 16
+    return masks
+
+def create_wall_tables():
+    """
+    ビットマスク -> (何番目のパターンか, タイル, 置く行のずれ) の表. 一致しなければ-1, 0, 0
+    """
+    order = np.full(17, -1, dtype=np.int16)
+    tiles = np.zeros(17, dtype=np.uint8)
+    lower = np.zeros(17, dtype=bool)
+    for i, (pattern, tile) in enumerate(WALL_PATTERNS):
+        (tl, tr), (bl, br) = pattern
+        mask = tl | tr << 1 | bl << 2 | br << 3
+        order[mask] = i
+        tiles[mask] = tile
+        lower[mask] = tile in LOWER_TILES
+    return order, tiles, lower
+
+WALL_ORDER, WALL_TILES, WALL_LOWER = create_wall_tables()
+
+def find_wall_tiles(data):
+    """
+    04_exampleのfind_tile_typeと同じタイルを返す
+    各マスには自分を左上とする窓(左上に置くもの)と、ひとつ上のマスを左上とする窓(左下に置くもの)の
+    2つから書かれうるので、後のパターンのほうを残す
+    """
+    masks = get_quad_masks(data)
+    order = WALL_ORDER[masks]
+    lower = WALL_LOWER[masks]
+
+    # 自分の窓から
+    own = np.where(~lower, order, -1)
+    # ひとつ上の窓から
+    above = np.full(masks.shape, -1, dtype=np.int16)
+    above[1:] = np.where(lower[:-1], order[:-1], -1)
+
+    best = np.maximum(own, above)
+    tiles = np.zeros(masks.shape, dtype=np.uint8)
+    hit = best >= 0
+    tiles[hit] = np.array([tile for _, tile in WALL_PATTERNS], dtype=np.uint8)[best[hit]]
+    return tiles
+
+# ---- 09_exampleのcreate_tile_map ----
+
+GOAL_TILE = 23
+
+# 境目の向き. 隣との差がもとの実装で見ていた値になったら立てる
+RIGHT_DROP = 1 # 右が1小さい
+LEFT_RISE = 2 # 左が1小さい
+DOWN_DROP = 4 # 下が1小さい
+UP_RISE = 8 # 上が1小さい
+
+def create_edge_table():
+    """
+    境目のビットマスク -> タイル. 右に通路(3) > 左に通路(4) > 下に通路(1) > 上に通路(2)の順に優先
+    """
+    table = np.zeros(16, dtype=np.uint8)
+    for mask in range(16):
+        if mask & RIGHT_DROP:
+            table[mask] = 3
+        elif mask & LEFT_RISE:
+            table[mask] = 4
+        elif mask & DOWN_DROP:
+            table[mask] = 1
+        elif mask & UP_RISE:
+            table[mask] = 2
+    return table
+
+EDGE_TABLE = create_edge_table()
+
+def get_edge_masks(data):
+    data = np.asarray(data, dtype=np.int16)
+    masks = np.zeros(data.shape, dtype=np.uint8)
+    dy = data[1:, :] - data[:-1, :]
+    dx = data[:, 1:] - data[:, :-1]
+    masks[:, :-1] |= (dx == -1).astype(np.uint8) * RIGHT_DROP
+    masks[:, 1:] |= (dx == 1).astype(np.uint8) * LEFT_RISE
+    masks[:-1, :] |= (dy == -1).astype(np.uint8) * DOWN_DROP
+    masks[1:, :] |= (dy == 1).astype(np.uint8) * UP_RISE
+    return masks
+
+# 2x2の並びを角のタイルに書きかえる規則. 上から順に、前の規則の結果に対して使う
+CORNER_RULES = [
+    ([[0, 1], [3, 0]], [[5, 1], [3, 0]]),
+    ([[3, 0], [0, 2]], [[3, 0], [6, 2]]),
+    ([[1, 0], [0, 4]], [[1, 7], [0, 4]]),
+    ([[0, 4], [2, 0]], [[0, 4], [2, 8]]),
+    ([[4, 2], [4, 0]], [[13, 2], [4, 0]]),
+    ([[4, 0], [4, 1]], [[4, 0], [14, 1]]),
+    ([[2, 3], [0, 3]], [[2, 15], [0, 3]]),
+    ([[0, 3], [1, 3]], [[0, 3], [1, 16]]),
+]
+
+def apply_corner_rules(tiles):
+    h, w = tiles.shape
+    # 各マスを左上とする窓の4マス
+    quad = [(0, 0), (0, 1), (1, 0), (1, 1)]
+    for src, dst in CORNER_RULES:
+        match = np.ones((h - 1, w - 1), dtype=bool)
+        for oy, ox in quad:
+            match &= tiles[oy:h-1+oy, ox:w-1+ox] == src[oy][ox]
+        if not match.any():
+            continue
+        # 前の規則の結果だけを見るように、書くのは別の配列にする
+        # 重なったら後の窓で上書きする. あるマスを最後に書くのは、そのマスを左上とする窓
+        new_tiles = tiles.copy()
+        for oy, ox in quad[::-1]:
+            new_tiles[oy:h-1+oy, ox:w-1+ox][match] = dst[oy][ox]
+        tiles = new_tiles
+    return tiles
+
+def create_tile_map(data):
+    """
+    09_exampleのcreate_tile_mapと同じタイルを返す
+    0: 通路か壁の中, -1: ゴール, 1: 壁
+    """
+    data = np.array(data, dtype=np.int16)
+    tiles = np.zeros(data.shape, dtype=np.uint8)
+
+    # goalがひとつだけなら、タイルを置いて通路として扱う
+    goal_yx = np.argwhere(data == -1)
+    if len(goal_yx) == 1:
+        y, x = goal_yx[0]
+        tiles[y, x] = GOAL_TILE
+        data[y, x] = 0
+
+    masks = get_edge_masks(data)
+    edges = masks > 0
+    tiles[edges] = EDGE_TABLE[masks[edges]]
+    return apply_corner_rules(tiles)
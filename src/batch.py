@@ -0,0 +1,171 @@
+"""
+create_map_dungeonで地図をまとめてつくり、1枚ごとの統計をとる
+プロセスを並べてつくり、できた順に地図をファイルに、統計をcsvに書く
+
+python batch.py --count 10000 --num-col-rooms 3 4 5 --corrider-width 1 2 --out out
+    # 設定の組み合わせごとにcount枚. seedは0から順に振る
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.ndimage import label
+
+import map_file
+import search
+from city import City
+from map import Map
+
+MAP_CLASSES = {"City": City, "Map": Map}
+
+FIELDS = ["seed", "cls", "w", "h", "num_col_rooms", "num_row_rooms", "corrider_width",
+          "min_room_size_ratio", "max_room_size_ratio",
+          "walkable", "rooms", "components", "connected", "diameter", "time", "path", "error"]
+
+def get_diameter(free):
+    """
+    一番大きな連結成分の直径(歩数). 2回の幅優先探索で求める近似で、実際の直径以下になる
+    """
+    labels, num = label(free)
+    if num == 0:
+        return 0
+    largest = np.argmax(np.bincount(labels.ravel())[1:]) + 1
+    barrier = labels != largest
+
+    start = tuple(np.argwhere(~barrier)[0])
+    cost = search.search_cost_bfs(barrier, start)
+    cost = np.where(barrier, -1, cost)
+    far = np.unravel_index(np.argmax(cost), cost.shape)
+    cost = search.search_cost_bfs(barrier, far)
+    return int(np.where(barrier, -1, cost).max())
+
+def create_one(job):
+    """
+    1枚つくって統計を返す. 別プロセスで呼ばれる
+    つくれない設定の組み合わせ(部屋が小さすぎるなど)でも止めずに, errorに理由を入れた行を返す
+    """
+    stats = dict(job)
+    del stats["out"]
+    try:
+        return create_stats(job, stats)
+    except Exception as e:
+        stats["error"] = f"{type(e).__name__}: {e}"
+        return stats
+
+def create_stats(job, stats):
+    map_cls = MAP_CLASSES[job["cls"]]
+    t = time.perf_counter()
+    map = map_cls(job["w"], job["h"], seed=job["seed"])
+    map.create_map_dungeon(num_col_rooms=job["num_col_rooms"],
+                           num_row_rooms=job["num_row_rooms"],
+                           corrider_width=job["corrider_width"],
+                           min_room_size_ratio=job["min_room_size_ratio"],
+                           max_room_size_ratio=job["max_room_size_ratio"])
+    elapsed = time.perf_counter() - t
+
+    free = map.walls == 0
+    _, components = label(free)
+    stats.update({
+        "walkable": float(free.mean()),
+        "rooms": map.num_rooms,
+        "components": components,
+        "connected": components == 1,
+        "diameter": get_diameter(free),
+        "time": elapsed,
+        "path": "",
+        "error": "",
+    })
+
+    if job["out"] is not None:
+        path = os.path.join(job["out"], "{cls}_{seed}_{w}x{h}_{num_col_rooms}_{num_row_rooms}_{corrider_width}_{min_room_size_ratio}_{max_room_size_ratio}.pxmap".format(**job))
+        map_file.save(map, path)
+        stats["path"] = path
+    return stats
+
+def get_jobs(args):
+    """
+    設定の組み合わせごとにcount枚分の仕事をつくる
+    """
+    settings = itertools.product(args.cls, args.size, args.num_col_rooms, args.num_row_rooms,
+                                 args.corrider_width, args.min_room_size_ratio, args.max_room_size_ratio)
+    seed = args.seed
+    for cls, size, ncol, nrow, width, min_ratio, max_ratio in settings:
+        for _ in range(args.count):
+            yield {
+                "seed": seed, "cls": cls, "w": size[0], "h": size[1],
+                "num_col_rooms": ncol, "num_row_rooms": nrow, "corrider_width": width,
+                "min_room_size_ratio": min_ratio, "max_room_size_ratio": max_ratio,
+                "out": args.out if args.save else None,
+            }
+            seed += 1
+
+def summarize(rows, elapsed):
+    """
+    設定ごとに平均, 最小, 最大をまとめる
+    """
+    groups = {}
+    for row in rows:
+        key = tuple(row[k] for k in FIELDS[1:9])
+        groups.setdefault(key, []).append(row)
+
+    print(f"{len(rows)} maps in {elapsed:.2f}[s] ({len(rows) / max(elapsed, 1e-9):.1f} maps/s)")
+    for key, group in groups.items():
+        print(" ".join(f"{k}={v}" for k, v in zip(FIELDS[1:9], key)))
+        errors = [r for r in group if r["error"]]
+        group = [r for r in group if not r["error"]]
+        print(f"  count     {len(group)}")
+        if errors:
+            print(f"  errors    {len(errors)} ({errors[0]['error']})")
+        if not group:
+            continue
+        print(f"  connected {np.mean([r['connected'] for r in group]) * 100:.1f}[%]")
+        for name in ["walkable", "rooms", "components", "diameter", "time"]:
+            values = np.array([r[name] for r in group], dtype=float)
+            print(f"  {name:<9} mean {values.mean():.4f} min {values.min():.4f} max {values.max():.4f}")
+
+def parse_size(s):
+    w, h = s.split("x")
+    return int(w), int(h)
+
+def main():
+    parser = argparse.ArgumentParser(description="create_map_dungeonをまとめて実行して統計をとる")
+    parser.add_argument("--count", type=int, default=100, help="設定ごとの枚数")
+    parser.add_argument("--cls", nargs="+", default=["Map"], choices=list(MAP_CLASSES))
+    parser.add_argument("--size", nargs="+", type=parse_size, default=[(64, 48)], help="WxH")
+    parser.add_argument("--num-col-rooms", nargs="+", type=int, default=[3])
+    parser.add_argument("--num-row-rooms", nargs="+", type=int, default=[2])
+    parser.add_argument("--corrider-width", nargs="+", type=int, default=[1])
+    parser.add_argument("--min-room-size-ratio", nargs="+", type=float, default=[0.3])
+    parser.add_argument("--max-room-size-ratio", nargs="+", type=float, default=[0.8])
+    parser.add_argument("--seed", type=int, default=0, help="最初の地図のseed. 1枚ごとに1ずつ増やす")
+    parser.add_argument("--out", default="batch_out", help="地図とstats.csvを書くディレクトリ")
+    parser.add_argument("--no-save", dest="save", action="store_false", help="地図は保存せず統計だけとる")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数. 省略するとCPUの数")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = list(get_jobs(args))
+    workers = args.workers or os.cpu_count()
+    # 小さい地図はすぐ終わるので、まとめて渡してプロセス間のやりとりを減らす
+    chunksize = max(1, len(jobs) // (workers * 16))
+
+    rows = []
+    t = time.perf_counter()
+    with open(os.path.join(args.out, "stats.csv"), "w", newline="") as f, \
+         ProcessPoolExecutor(max_workers=workers) as executor:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for i, row in enumerate(executor.map(create_one, jobs, chunksize=chunksize)):
+            writer.writerow(row)
+            rows.append(row)
+            if (i + 1) % 1000 == 0:
+                f.flush()
+                print(f"{i + 1}/{len(jobs)}")
+    summarize(rows, time.perf_counter() - t)
+
+if __name__ == "__main__":
+    main()
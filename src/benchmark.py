@@ -0,0 +1,130 @@
+"""
+地図の生成などの処理時間をはかる
+
+python benchmark.py            # 全部
+python benchmark.py dilation   # 指定したものだけ
+"""
+import sys
+import time
+
+import numpy as np
+
+from city import City, dilation
+from map import Map
+
+def dilation_reference(arr, ksize=3):
+    """
+    ループで書いたもとのdilation. 結果が同じかを確かめるのに使う
+    """
+    ret_arr = np.copy(arr)
+    if ksize % 2 == 0:
+        l = int(ksize / 2.0)
+        r = int(ksize / 2.0)
+    else:
+        l = int(np.floor(ksize / 2.0))
+        r = int(np.floor(ksize / 2.0))+1
+
+    for iy in range(l, arr.shape[0]-r):
+        for ix in range(l, arr.shape[1]-r):
+            if np.any(arr[iy, ix]==0):
+                ret_arr[iy-l:iy+r, ix-l:ix+r] = 0
+    return ret_arr
+
+def stick_down_reference(walls, rng):
+    """
+    ループで書いたもとのcreate_map_stick_down. 結果が同じかを確かめるのに使う
+    """
+    h, w = walls.shape
+    for i in range(1, w)[::2]:
+        for j in range(1, h)[::2]:
+            walls[j, i] = 1
+
+    for i in range(1, w)[::2]:
+        for j in range(1, h)[::2]:
+            num = rng.integers(3)
+            if num == 0:
+                walls[j, i+1] = 1
+            elif num == 1:
+                walls[j-1, i] = 1
+            elif num ==2:
+                walls[j, i-1] = 1
+            elif num==3:
+                walls[j+1, i] = 1
+    return walls
+
+def measure(func, *args, **kwargs):
+    t = time.perf_counter()
+    ret = func(*args, **kwargs)
+    return ret, time.perf_counter() - t
+
+def check_dilation():
+    """
+    ksizeの偶奇で端の扱いが違うので、1~8の全てでループ版と同じかを確かめる
+    """
+    rng = np.random.default_rng(0)
+    for shape in [(64, 64), (65, 47), (9, 9)]:
+        for density in [0.02, 0.05, 0.3]:
+            arr = (rng.random(shape) > density).astype(int)
+            for ksize in range(1, 9):
+                assert np.array_equal(dilation(arr, ksize=ksize), dilation_reference(arr, ksize=ksize)), (shape, density, ksize)
+    print("dilation matches the loop for ksize 1-8")
+
+def bench_dilation():
+    check_dilation()
+    print("dilation")
+    print(f"{'size':>10} {'ksize':>6} {'vectorized[s]':>14} {'loop[s]':>10}")
+    for size in [64, 128, 256, 512, 1024, 2048]:
+        # 通路くらいの疎な0を置く
+        arr = (np.random.rand(size, size) > 0.05).astype(int)
+        for ksize in [2, 3]:
+            ret, t = measure(dilation, arr, ksize=ksize)
+            # ループ版は遅いので小さい地図だけ
+            if size <= 256:
+                ret_ref, t_ref = measure(dilation_reference, arr, ksize=ksize)
+                assert np.array_equal(ret, ret_ref)
+                t_ref = f"{t_ref:10.4f}"
+            else:
+                t_ref = f"{'-':>10}"
+            print(f"{size:>5}x{size:<4} {ksize:>6} {t:14.4f} {t_ref}")
+
+def bench_dungeon():
+    print("create_map_dungeon")
+    # City: 各場所までの歩数も求める(デフォルト), City lazy: precompute_location_costs=False
+    print(f"{'size':>10} {'rooms':>8} {'City[s]':>8} {'City lazy[s]':>12} {'Map[s]':>8}")
+    for size, num_rooms in [(256, 6), (512, 12), (1024, 25), (2048, 50), (4096, 100)]:
+        times = []
+        for cls, kwargs in [(City, {}), (City, {"precompute_location_costs": False}), (Map, {})]:
+            map = cls(size, size, seed=0)
+            _, t = measure(map.create_map_dungeon, num_col_rooms=num_rooms, num_row_rooms=num_rooms, **kwargs)
+            times.append(t)
+        print(f"{size:>5}x{size:<4} {num_rooms:>3}x{num_rooms:<4} {times[0]:8.4f} {times[1]:12.4f} {times[2]:8.4f}")
+
+def bench_stick_down():
+    print("create_map_stick_down")
+    print(f"{'size':>10} {'City[s]':>8} {'Map[s]':>8} {'loop[s]':>10} {'ns/cell':>8}")
+    # 外周が壁になるように奇数の大きさにする
+    for size in [257, 513, 1025, 2049, 4097]:
+        times = []
+        for cls in [City, Map]:
+            map = cls(size, size, seed=0)
+            _, t = measure(map.create_map_stick_down)
+            times.append(t)
+        # ループ版は遅いので小さい地図だけ
+        if size <= 513:
+            ref, t_ref = measure(stick_down_reference, np.zeros((size, size), np.uint8), np.random.default_rng(0))
+            assert np.array_equal(map.walls, ref)
+            t_ref = f"{t_ref:10.4f}"
+        else:
+            t_ref = f"{'-':>10}"
+        print(f"{size:>5}x{size:<4} {times[0]:8.4f} {times[1]:8.4f} {t_ref} {times[1] / size**2 * 1e9:8.2f}")
+
+BENCHMARKS = {
+    "dilation": bench_dilation,
+    "dungeon": bench_dungeon,
+    "stick_down": bench_stick_down,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
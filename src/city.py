@@ -1,28 +1,59 @@
+from collections import deque
 from enum import Enum
+import itertools
 import random
 import numpy as np
 from scipy.signal import convolve2d
 from scipy.ndimage.filters import minimum_filter, maximum_filter
 
+import dungeon
+import free_cells
+import layers
+import search
+
+# create_map_stick_downで柱を倒す向き [r,u,l,d]
+STICK_DOWN_DY = np.array([0, -1, 0, 1])
+STICK_DOWN_DX = np.array([1, 0, -1, 0])
+
 def dilation(arr, ksize=3):                
+    """
+    0のマスをまわりksize x ksizeに広げる
+    端からl, rマス以内の0は広げない
+    """
 
     ret_arr = np.copy(arr)
-    dilation_kernel = np.ones((ksize, ksize))
     if ksize % 2 == 0: 
         l = int(ksize / 2.0)
         r = int(ksize / 2.0)
     else:
         l = int(np.floor(ksize / 2.0))
         r = int(np.floor(ksize / 2.0))+1    
-            
-    for iy in range(l, arr.shape[0]-r):
-        for ix in range(l, arr.shape[1]-r):
-            if np.any(arr[iy, ix]==0):
-                ret_arr[iy-l:iy+r, ix-l:ix+r] = 0                            
+
+    h, w = arr.shape
+    if not (l < h - r and l < w - r):
+        return ret_arr
+
+    # 広げる元になる0のマス
+    src = np.zeros((h, w), dtype=bool)
+    src[l:h-r, l:w-r] = arr[l:h-r, l:w-r] == 0
+
+    # 正方形なので縦と横に分けてずらしながら重ねる
+    # 元のマスから -l ~ r-1 ずれたマスまで0になる
+    for axis in (0, 1):
+        n = src.shape[axis]
+        dst = np.zeros_like(src)
+        for d in range(-l, r):
+            if axis == 0:
+                dst[max(d, 0):n+min(d, 0)] |= src[max(-d, 0):n-max(d, 0)]
+            else:
+                dst[:, max(d, 0):n+min(d, 0)] |= src[:, max(-d, 0):n-max(d, 0)]
+        src = dst
+
+    ret_arr[src] = 0
     return ret_arr
 
 class City:
-    def __init__(self, w, h, debug=False):
+    def __init__(self, w, h, debug=False, seed=None):
         super().__init__()
         """
         self.dataが地図
@@ -37,8 +68,13 @@ class City:
         """
         self.w = w
         self.h = h
-        self.data = np.zeros((h, w), np.int)
-        self.occupancuy = np.zeros((h, w), dtype=bool) # True = キャラがいる
+        # 地図は壁と目印の層に分けて持つ. self.dataはそれを重ねて読むためのもの
+        self.walls = np.zeros((h, w), np.uint8)
+        self.poi = {} # {(y, x): -1 or -2 or 目的地番号}
+        self.data_view = layers.DataView(self)
+        self.occupancuy = np.zeros((h, w), dtype=bool) # True = キャラがいる. occupy/releaseで書きかえる
+        self.occupancuy_version = 0 # occupancuyが変わるたびに増やす
+        self.occupancuy_changes = deque(maxlen=4096) # occupancuyが変わったマス. versionを1増やすごとに1つ足す
             
         self.location_idxs = list(range(2, 100))
         self.locations = {}
@@ -47,6 +83,7 @@ class City:
         # {
         #      2: (x, y)
         # }
+        self.location_costs = {} # 各場所までの歩数. キーはlocationsと同じ
     
         self.goal_x = None
         self.goal_y = None
@@ -55,250 +92,316 @@ class City:
         
         
         self.debug = debug         
+
+        # 地図づくりはこの乱数だけを使う. 同じseedなら同じ地図になる
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        # 地図を変えるたびに増やす. 経路のキャッシュはこれが変わったら捨てる
+        self.version = 0
+        self.path_cache = search.PathCache()
+
+        # 部屋の区切り. create_map_dungeonで決まる
+        self.room_row_idx = None
+        self.room_col_idx = None
+        self.num_rooms = None # create_map_dungeonで描いた部屋の数
+        self.room_graph = None # search_shortest_path_hierarchicalで使う
+        self.reachability = None # is_reachableで使う. versionが変わったらつくり直す
+        self.reachability_version = None
+        self.free_cells = None # get_free_spaceで使う. versionが変わったらつくり直す
+        self.free_cells_version = None
         
+    @property
+    def data(self):
+        """
+        wallsとpoiを重ねたもの. 1マスずつでも配列としても読み書きできる
+        """
+        return self.data_view
+
+    @data.setter
+    def data(self, data):
+        self.walls, self.poi = layers.split_layers(data)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        壁や目印を書きかえたときに呼ぶ. create_map_*とdataへの代入はここを通る
+        versionを増やして, 地図から求めたもの(経路, 部屋のグラフ, 到達判定, 空きマス)をまとめて捨てる
+        """
+        self.version += 1
+        self.path_cache.clear()
+        self.room_graph = None
+        self.reachability = None
+        self.free_cells = None
+        self.free_cells_version = None
+
     def create_map_stick_down(self):
+        self.invalidate()
         
         # 柱の設置
-        for i in range(1, self.w)[::2]:
-            for j in range(1, self.h)[::2]:
-                self.data[j, i] = 1 # occupied
+        self.walls[1::2, 1::2] = 1 # occupied
                 
-        # 柱を倒す
-        for i in range(1, self.w)[::2]:
-            for j in range(1, self.h)[::2]:
-                num = np.random.randint(3) # [r,u,l,d] = [0, 1, 2, 3]
-                if num == 0:
-                    self.data[j, i+1] = 1
-                elif num == 1:
-                    self.data[j-1, i] = 1
-                elif num ==2:
-                    self.data[j, i-1] = 1
-                elif num==3:
-                    self.data[j+1, i] = 1
+        # 柱を倒す. 向きは柱ごとに列, 行の順でまとめて引く
+        i = np.arange(1, self.w, 2)[:, None]
+        j = np.arange(1, self.h, 2)[None, :]
+        num = self.rng.integers(3, size=(i.shape[0], j.shape[1])) # [r,u,l,d] = [0, 1, 2, 3]
+        self.walls[j + STICK_DOWN_DY[num], i + STICK_DOWN_DX[num]] = 1
                     
     def create_map_dungeon(self, num_col_rooms=3, 
                            num_row_rooms=2, 
                            corrider_width=1, 
                            min_room_size_ratio=0.3, 
-                           max_room_size_ratio=0.8
+                           max_room_size_ratio=0.8,
+                           precompute_location_costs=True
                            ):
         """
+        precompute_location_costs: Trueなら各場所までの歩数をここで求める
+            Falseなら最初にその場所へ行くときに求める. 大きな地図で生成を速くしたいとき用
+            (4096x4096ではTrueだと歩数だけで数秒かかる. python benchmark.py dungeon)
         """
+        self.invalidate()
 
-        self.data = np.ones(self.data.shape, np.int)
-        
         # 適当に配列を分割する
-        # NOTE: 各値は偶数でないと道がつながらない。
-        rand_col_idx = [ int(e)&~1 for e in np.linspace(0, self.w-1, num=int(num_col_rooms)+1)]
-        rand_row_idx = [ int(e)&~1 for e in np.linspace(0, self.h-1, num=int(num_row_rooms)+1)]
-
-        # 各部屋の中心, 大きさ
-        num_col_rooms = len(rand_col_idx) - 1
-        num_row_rooms = len(rand_row_idx) - 1
-        room_max_size_x = np.zeros((num_row_rooms, num_col_rooms),np.int)
-        room_max_size_y = np.zeros((num_row_rooms, num_col_rooms),np.int)
-        room_center_x = np.zeros((num_row_rooms, num_col_rooms),np.int)
-        room_center_y = np.zeros((num_row_rooms, num_col_rooms),np.int)
-
-        for ic in range(len(rand_col_idx)-1):
-            for ir in range(len(rand_row_idx)-1):
-                x = int(0.5 * (rand_col_idx[ic] + rand_col_idx[ic+1]))
-                size_x = rand_col_idx[ic+1] - rand_col_idx[ic]
-                y = int(0.5 * (rand_row_idx[ir] + rand_row_idx[ir+1]))
-                size_y = rand_row_idx[ir+1] - rand_row_idx[ir]
-
-                room_center_y[ir, ic] = int(y)
-                room_max_size_y[ir, ic] = int(size_y)
-                room_center_x[ir, ic] = int(x)
-                room_max_size_x[ir, ic] = int(size_x)
-        
-        # 各部屋の大きさを決める
-        room_size_x = np.zeros((num_row_rooms, num_col_rooms))
-        room_size_y = np.zeros((num_row_rooms, num_col_rooms))
-        for iy in range(num_row_rooms):
-            for ix in range(num_col_rooms):            
-                rmsx = room_max_size_x[iy,ix]
-                rmsy = room_max_size_y[iy,ix]
-                
-                rsx = np.random.randint(int(rmsx * min_room_size_ratio), int(rmsx * max_room_size_ratio))
-                rsy = np.random.randint(int(rmsy * min_room_size_ratio), int(rmsy * max_room_size_ratio))
-                room_size_x[iy, ix] = rsx
-                room_size_y[iy, ix] = rsy
-    
+        rand_row_idx, rand_col_idx = dungeon.split_rooms(self.h, self.w, num_col_rooms, num_row_rooms)
+        self.room_row_idx = rand_row_idx
+        self.room_col_idx = rand_col_idx
+
+        # 各部屋の中心, 大きさ, 通路への出口
+        rooms = dungeon.create_rooms(rand_row_idx, rand_col_idx, min_room_size_ratio, max_room_size_ratio, rng=self.rng)
+        self.num_rooms = dungeon.count_rooms(rooms)
+        exits = dungeon.get_exits(len(rand_row_idx)-1, len(rand_col_idx)-1, single_line=True)
+
         # 各部屋を塗りつぶす + 通路をつくる
-        corriders = np.ones(self.data.shape, np.int)
-        for iy in range(num_row_rooms):
-            for ix in range(num_col_rooms):            
-                w = room_size_x[iy, ix]
-                h = room_size_y[iy, ix]
-                cx = room_center_x[iy, ix]
-                cy = room_center_y[iy, ix]                
-                rmsx = room_max_size_x[iy,ix]
-                rmsy = room_max_size_y[iy,ix]
-                self.data[cy-int(h/2.0):cy+int(h/2.0), cx-int(w/2.0):cx+int(w/2.0)] = 0
-        
-                # 各部かから通路への垂線を上下左右４本分生成
-                exit_x_up = np.random.randint(cx-int(w/2.0)+1, cx+int(w/2.0)-1)
-                exit_x_down = np.random.randint(cx-int(w/2.0)+1, cx+int(w/2.0)-1)
-                exit_left = np.random.randint(cy-int(h/2.0)+1, cy+int(h/2.0)-1)
-                exit_right = np.random.randint(cy-int(h/2.0)+1, cy+int(h/2.0)-1)
-                
-                # cxからcx+rmsx/2.0, cx-rmsx/2.0だけ線を引く
-                # ただし, 端に触れていへ部屋は通路をつくらない
-                
-                rx = int(rmsx/2.0)
-                ry = int(rmsy/2.0)
-                
-                # 列が1つの場合
-                if num_row_rooms == 1 and ix == 0:
-                    corriders[exit_right, cx:cx+rx] = 0
-                elif num_row_rooms == 1 and ix == num_col_rooms-1:
-                    corriders[exit_left, cx-rx:cx] = 0
-                # 行が1つの場合
-                elif num_col_rooms == 1 and iy == 0:
-                    corriders[cy:cy+ry, exit_x_down] = 0
-                elif num_col_rooms == 1 and iy == num_row_rooms-1:
-                    corriders[cy-ry:cy, exit_x_up] = 0
-
-                elif iy == 0 and ix == 0:
-                    corriders[exit_right, cx:cx+rx] = 0
-                    corriders[cy:cy+ry, exit_x_down] = 0
-                # 
-                elif iy == num_row_rooms-1 and ix == num_col_rooms-1:
-                    corriders[exit_left, cx-rx:cx] = 0
-                    corriders[cy-ry:cy, exit_x_up] = 0
-                # 
-                elif iy == 0 and ix == num_col_rooms-1:
-                    corriders[exit_left, cx-rx:cx] = 0
-                    corriders[cy:cy+ry, exit_x_down] = 0
-                # 
-                elif iy == num_row_rooms-1 and ix == 0:
-                    corriders[exit_right, cx:cx+rx] = 0
-                    corriders[cy-ry:cy, exit_x_up] = 0
-                # 
-                elif iy == num_row_rooms-1 and ix == 0:
-                    corriders[exit_right, cx:cx+rx] = 0
-                    corriders[cy-ry:cy, exit_x_up] = 0
-
-                elif iy == 0:
-                    corriders[exit_left, cx-rx:cx] = 0
-                    corriders[exit_right, cx:cx+rx] = 0
-                    corriders[cy:cy+ry, exit_x_down] = 0
-
-                elif iy == num_row_rooms-1:
-                    corriders[exit_left, cx-rx:cx] = 0
-                    corriders[exit_right, cx:cx+rx] = 0
-                    corriders[cy-ry:cy, exit_x_up] = 0
-
-                elif ix == 0:
-                    corriders[exit_right, cx:cx+rx] = 0
-                    corriders[cy-ry:cy, exit_x_up] = 0
-                    corriders[cy:cy+ry, exit_x_down] = 0
-
-                elif ix == num_col_rooms-1:
-                    corriders[exit_left, cx-rx:cx] = 0
-                    corriders[cy-ry:cy, exit_x_up] = 0
-                    corriders[cy:cy+ry, exit_x_down] = 0
-                            
-                else:                
-                    corriders[exit_left, cx-rx:cx] = 0
-                    corriders[exit_right, cx:cx+rx] = 0
-                    corriders[cy-ry:cy, exit_x_up] = 0
-                    corriders[cy:cy+ry, exit_x_down] = 0
-
-        # 線をつなげる
-        rand_col_idx = np.array(rand_col_idx)
-        for col_idx in rand_col_idx[1:-1]:
-            end_y_l = np.where(corriders[:, col_idx - 1]== 0 )
-            end_y_r = np.where(corriders[:, col_idx + 1]== 0 )
-            for idx in range(num_row_rooms):
-                end_y = sorted([end_y_l[0][idx], end_y_r[0][idx]])
-                corriders[end_y[0]:end_y[1]+1, col_idx] = 0                
-
-        rand_row_idx = np.array(rand_row_idx)
-        for row_idx in rand_row_idx[1:-1]:
-            end_x_u = np.where(corriders[row_idx - 1, :]== 0 )
-            end_x_d = np.where(corriders[row_idx + 1, :]== 0 )
-            for idx in range(num_col_rooms):
-                end_x = sorted([end_x_u[0][idx], end_x_d[0][idx]])
-                corriders[row_idx, end_x[0]:end_x[1]+1] = 0                
+        # ただし, 端に触れてい部屋は通路をつくらない
+        walls = ~dungeon.draw_rooms((self.h, self.w), rooms)
+        corriders = ~dungeon.draw_corridors((self.h, self.w), rooms, exits)
 
         if corrider_width > 1:            
             dilated_corriders = dilation(corriders, ksize=corrider_width)
-            corriders = np.logical_xor(dilated_corriders.astype(np.bool), ~(corriders).astype(np.bool))
+            corriders = np.logical_xor(dilated_corriders.astype(bool), ~(corriders).astype(bool))
 
-        self.data = np.logical_and(self.data, corriders)
+        self.walls = np.logical_and(walls, corriders).astype(np.uint8)
+        self.poi = {}
 
 
         # 各部屋に場所番号を与える
-        idx = 0
-        for iy in range(len(rand_row_idx)-1):
-            for ix in range(len(rand_col_idx)-1):
-
-                cx = room_center_x[iy, ix]
-                cy = room_center_y[iy, ix]                
-                
-                # self.data[cy, cx] = self.location_idxs[idx % len(self.location_idxs)]
-                # print(cx, cy, self.data[cy, cx])
-                self.locations[self.data[cy, cx]] = (cy, cx)
-                idx += 1
+        room_idxs = self.walls[rooms["center_y"], rooms["center_x"]].ravel().tolist()
+        room_centers = zip(rooms["center_y"].ravel().tolist(), rooms["center_x"].ravel().tolist())
+        for room_idx, cyx in zip(room_idxs, room_centers):
+            self.locations[room_idx] = cyx
             
         # 積み込み場と排土場に分ける TODO:偶奇でわけているだけ
         self.dumpings = {e[0]:e[1] for e in self.locations.items() if e[0] % 2 == 0}
         self.loadings = {e[0]:e[1] for e in self.locations.items() if e[0] % 2 != 0}
 
-    def get_free_space(self, num=1):
-        
-        idx = list(zip(*np.where(self.data==0)))
-        xy = random.sample(idx, num)
-        # x = random.sample(range(self.w), num, replace=False)
-        # y = random.choice(range(self.h), num, replace=False)
-        # x = np.random.randint(self.w)
-        # y = np.random.randint(self.h)        
-        # while self.data[y, x] != 0:
-        #     x = random.choice(range(self.w), num, replace=False)
-        #     y = random.choice(range(self.h), num, replace=False)
-
-        #     x = np.random.randint(self.w)
-        #     y = np.random.randint(self.h)        
-    
-        return xy
+        # 車は決まった場所にしか行かないので、各場所までの歩数を先に求めておく
+        self.location_costs = {}
+        if precompute_location_costs:
+            self.location_costs = {idx: self.get_distance_field(yx) for idx, yx in self.locations.items()}
 
-    def set_start(self):
+    def get_free_cells(self):
+        """
+        空いているマスの集合. 壁, 目印, occupancuyのマスは入らない
+        地図が変わったらつくり直し, occupancuyの変化はoccupy/releaseで反映する
+        """
+        if self.free_cells_version != self.version:
+            free = (self.walls == 0) & ~self.occupancuy
+            for yx in self.poi:
+                free[yx] = False
+            self.free_cells = free_cells.FreeCells(free)
+            self.free_cells_version = self.version
+        return self.free_cells
+
+    def get_free_space(self, num=1, replace=False):
+        """
+        空いているマスからnumマス選ぶ. replace=Falseなら重ならない
+        """
+        return self.get_free_cells().sample(num, self.rng, replace=replace)
 
-        # 地図中にスタートがあれば通路0に置き換え
-        self.data = np.where(self.data == -2, 0, self.data)
-        
-        # 通路0を引くまでランダムに選択する TODO: np.where + random.sampleで置き換える
-        x = np.random.randint(self.w)
-        y = np.random.randint(self.h)        
-        while self.data[y, x] != 0 and self.data[y, x] != -1:
-            x = np.random.randint(self.w)
-            y = np.random.randint(self.h)        
-
-        self.data[y, x] = -2 # Start
-        self.start_x = x
-        self.start_y = y
+    def occupy(self, yx):
+        """
+        キャラが(y, x)に入った
+        """
+        if not self.occupancuy[yx]:
+            self.occupancuy[yx] = True
+            self.occupancuy_version += 1
+            self.occupancuy_changes.append(yx)
+        if self.free_cells_version == self.version:
+            self.free_cells.remove(yx)
+
+    def release(self, yx):
+        """
+        キャラが(y, x)から出た
+        """
+        if self.occupancuy[yx]:
+            self.occupancuy[yx] = False
+            self.occupancuy_version += 1
+            self.occupancuy_changes.append(yx)
+        if self.free_cells_version == self.version and self.walls[yx] == 0 and yx not in self.poi:
+            self.free_cells.add(yx)
+
+    def get_occupancy_changes(self, since):
+        """
+        occupancuy_versionがsinceだったときから変わったマス[(y, x), ...]. 同じマスが何度も入ることもある
+        sinceがNoneのときや、覚えている分より古いときはNone. 呼んだ側で全体を見直す
+        """
+        if since is None:
+            return None
+        n = self.occupancuy_version - since
+        if n < 0 or n > len(self.occupancuy_changes):
+            return None
+        return list(itertools.islice(self.occupancuy_changes, len(self.occupancuy_changes) - n, None))
+
+    def remove_marker(self, y, x, value):
+        """
+        (y, x)の目印valueを消して空きマスに戻す. 目印が書きかえられていたら何もしない
+        """
+        if y is None or self.poi.get((y, x)) != value:
+            return
+        del self.poi[(y, x)]
+        if self.free_cells_version == self.version and self.walls[y, x] == 0 and not self.occupancuy[y, x]:
+            self.free_cells.add((y, x))
+
+    def put_marker(self, value):
+        """
+        空いているマスをひとつ選んで目印valueを置く
+        """
+        y, x = self.get_free_space(num=1)[0]
+        self.free_cells.remove((y, x))
+        self.poi[(y, x)] = value
+        return y, x
+
+    def set_start(self):
+        # 前のスタートだけ通路0に戻す. 壁は変わらないのでversionは増やさない
+        self.remove_marker(self.start_y, self.start_x, -2)
+        self.start_y, self.start_x = self.put_marker(-2) # Start
         
     def set_goal(self):
-        # 地図中にゴールがあれば通路0に置き換えTODO: np.where + random.sampleで置き換える
-        self.data = np.where(self.data == -1, 0, self.data)
-
-        x = np.random.randint(self.w)
-        y = np.random.randint(self.h)        
-        while self.data[y, x] != 0 and self.data[y, x] != -2:
-            x = np.random.randint(self.w)
-            y = np.random.randint(self.h)        
-
-        self.data[y, x] = -1 # Goal
-        self.goal_x = x
-        self.goal_y = y
+        # 前のゴールだけ通路0に戻す
+        self.remove_marker(self.goal_y, self.goal_x, -1)
+        self.goal_y, self.goal_x = self.put_marker(-1) # Goal
  
+    def is_reachable(self, start, goal):
+        """
+        start = (y, x)
+        goal = (y, x)
+        壁やoccupancuyで塞がれていなければTrue. 連結成分のラベルを引くだけなのでO(1)
+        壁のラベルは地図のversionごとにつけ直し, occupancuyのラベルは変わったマスのまわりだけ直す
+        """
+        if self.reachability is None or self.reachability_version != self.version:
+            self.reachability = search.Reachability(self.walls == 1)
+            self.reachability_version = self.version
+        changed = self.get_occupancy_changes(self.reachability.occupancy_version)
+        return self.reachability.is_reachable(start, goal, occupancy=self.occupancuy,
+                                              occupancy_version=self.occupancuy_version, changed=changed)
+
+    def search_shortest_path(self, start, goal, method="bfs"):
+        """
+        start = (y, x)
+        goal = (y, x)
+        method = "bfs" : search_shortest_path_dwsと同じ経路をキューで探索する
+                 "astar" : マンハッタン距離のA*. 経路の長さはbfsと同じ
+        occupancuyのマスも障害物として扱う
+        goalに到達できなければNone
+        同じstart, goalの結果はpath_cacheに残しておく
+        """
+        key = (int(start[0]), int(start[1]), int(goal[0]), int(goal[1]), method)
+        route = self.path_cache.get(key, self.version, occupancy=self.occupancuy)
+        if route is None:
+            # キャッシュになかったときだけ、行けるかを先に調べる
+            if not self.is_reachable(start, goal):
+                return None
+            barrier = search.get_barrier(self.walls, start, goal, occupancy=self.occupancuy)
+            route = search.search_shortest_path(barrier, start, goal, method=method)
+            if route is None:
+                return None
+            self.path_cache.put(key, route)
+        return list(route)
+
+    def search_shortest_path_bounded(self, start, goal, radius, max_expansions=None):
+        """
+        start = (y, x)
+        goal = (y, x)
+        startから上下左右radiusマスの窓の中だけを探索する. 地図の大きさによらずO(radius^2)
+        max_expansionsを与えるとそれだけマスを展開したところで諦める
+        窓の中で行けなければNone
+        occupancuyのマスも障害物として扱う
+        """
+        return search.search_bounded(self.walls, start, goal, radius, max_expansions=max_expansions, occupancy=self.occupancuy)
+
+    def search_many(self, starts, goals):
+        """
+        starts = [(y, x), ...]
+        goals = [(y, x), ...]
+        複数キャラの経路を1回の呼び出しで探す. startかgoalが同じキャラは探索を1回で済ませる
+        starts, goalsと同じ順に経路を返す. 到達できなければNone
+        """
+        return search.search_many(self.walls, starts, goals, occupancy=self.occupancuy)
+
+    def get_distance_field(self, goal):
+        """
+        goal = (y, x)
+        全マスについてgoalまでの歩数を求める. 到達できないマスはsearch.UNREACHABLE
+        同じgoalを目指すキャラが何体いても探索は1回で済み、
+        各キャラの経路はsearch.descend(cost, (y, x))で取り出せる
+        """
+        barrier = search.get_barrier(self.walls, goal, goal)
+        return search.search_cost_bfs(barrier, goal)
+
+    def search_route_to_location(self, start, location_idx):
+        """
+        start = (y, x)
+        location_idx: locationsのキー
+        create_map_dungeonで求めた歩数をたどるだけなので、地図の大きさによらず経路長に比例する
+        (map_fileから読んだ地図のように歩数がなければ、最初に使うときに求める)
+        occupancuyは考慮しない. 到達できなければNone
+        """
+        if location_idx not in self.location_costs:
+            self.location_costs[location_idx] = self.get_distance_field(self.locations[location_idx])
+        return search.descend(self.location_costs[location_idx], start)
+
+    def search_shortest_path_hierarchical(self, start, goal):
+        """
+        start = (y, x)
+        goal = (y, x)
+        部屋を節点にしたグラフで探してから、通る部屋の中だけ経路を求める
+        地図が大きくても探索するのは通る部屋だけになるが、最短とは限らない
+        occupancyは考慮しない. goalに到達できなければNone
+        """
+        if self.room_graph is None:
+            # 部屋の区切りがなければ16マスごとに区切る
+            row_idx = self.room_row_idx if self.room_row_idx is not None else range(0, self.h, 16)
+            col_idx = self.room_col_idx if self.room_col_idx is not None else range(0, self.w, 16)
+            self.room_graph = search.RoomGraph(self.walls == 1, row_idx, col_idx)
+        return self.room_graph.search(start, goal)
+
+    def create_planner(self, start, goal):
+        """
+        start = (y, x)
+        goal = (y, x)
+        occupancuyが変わったところだけ探索し直すsearch.DStarLiteをつくる
+        self.replan(planner, (y, x))で今いる場所からの経路を返す
+        """
+        return search.DStarLite(self.walls == 1, start, goal, occupancy=self.occupancuy,
+                                occupancy_version=self.occupancuy_version)
+
+    def replan(self, planner, start):
+        """
+        start = (y, x)
+        plannerが前に見たときからoccupy/releaseで変わったマスだけを渡して再計画する
+        """
+        changed = self.get_occupancy_changes(planner.occupancy_version)
+        return planner.replan(start, self.occupancuy, changed=changed, occupancy_version=self.occupancuy_version)
+
     def search_shortest_path_dws(self, start, goal):
         """
         start = (y, x)
         goal = (y, x)
         """
+        # 行けない場合は999回まわったあと、経路を戻るところで止まらなくなるので先に調べる
+        if not self.is_reachable(start, goal):
+            return None
+
         import matplotlib.pyplot as plt
         import matplotlib.cm as cm
         import matplotlib.colors as colors
@@ -324,7 +427,7 @@ class City:
                     start_goal[iy, ix] = -255
                 if iy == goal[0] and ix == goal[1]:                
                     start_goal[iy, ix] = 255
-                if self.data[iy, ix] == 1: # barrier
+                if self.walls[iy, ix] == 1: # barrier
                     barrier[iy, ix] = True 
 
         barrier = barrier + self.occupancuy
@@ -0,0 +1,164 @@
+"""
+create_map_dungeonの部屋と通路を配列演算でつくる
+部屋ごとのループを使わないので、部屋の数が多い大きな地図でもすぐ終わる
+"""
+import numpy as np
+
+# 部屋から通路への出口の向き. ビットで持つ
+LEFT = 1
+RIGHT = 2
+UP = 4
+DOWN = 8
+
+def split_rooms(h, w, num_col_rooms, num_row_rooms):
+    """
+    適当に配列を分割する
+    NOTE: 各値は偶数でないと道がつながらない。
+    """
+    rand_col_idx = [ int(e)&~1 for e in np.linspace(0, w-1, num=int(num_col_rooms)+1)]
+    rand_row_idx = [ int(e)&~1 for e in np.linspace(0, h-1, num=int(num_row_rooms)+1)]
+    return rand_row_idx, rand_col_idx
+
+def create_rooms(rand_row_idx, rand_col_idx, min_room_size_ratio, max_room_size_ratio, rng=None):
+    """
+    各部屋の中心, 大きさ, 出口の位置を(行, 列)の配列でまとめて決める
+    rng: np.random.Generator. 同じseedなら同じ部屋になる
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    col_idx = np.array(rand_col_idx)
+    row_idx = np.array(rand_row_idx)
+    num_col_rooms = len(col_idx) - 1
+    num_row_rooms = len(row_idx) - 1
+    shape = (num_row_rooms, num_col_rooms)
+
+    # 各部屋の中心, 大きさ
+    center_x = np.broadcast_to((0.5 * (col_idx[:-1] + col_idx[1:])).astype(int), shape)
+    center_y = np.broadcast_to((0.5 * (row_idx[:-1] + row_idx[1:])).astype(int)[:, None], shape)
+    max_size_x = np.broadcast_to(col_idx[1:] - col_idx[:-1], shape)
+    max_size_y = np.broadcast_to((row_idx[1:] - row_idx[:-1])[:, None], shape)
+
+    # 各部屋の大きさを決める
+    size_x = rng.integers((max_size_x * min_room_size_ratio).astype(int), (max_size_x * max_room_size_ratio).astype(int))
+    size_y = rng.integers((max_size_y * min_room_size_ratio).astype(int), (max_size_y * max_room_size_ratio).astype(int))
+    half_x = size_x // 2
+    half_y = size_y // 2
+
+    # 各部かから通路への垂線を上下左右４本分の位置
+    return {
+        "center_x": center_x,
+        "center_y": center_y,
+        "max_size_x": max_size_x,
+        "max_size_y": max_size_y,
+        "half_x": half_x,
+        "half_y": half_y,
+        "exit_x_up": rng.integers(center_x - half_x + 1, center_x + half_x - 1),
+        "exit_x_down": rng.integers(center_x - half_x + 1, center_x + half_x - 1),
+        "exit_left": rng.integers(center_y - half_y + 1, center_y + half_y - 1),
+        "exit_right": rng.integers(center_y - half_y + 1, center_y + half_y - 1),
+        "col_idx": col_idx,
+        "row_idx": row_idx,
+    }
+
+def get_exits(num_row_rooms, num_col_rooms, single_line=True):
+    """
+    各部屋がどの向きに通路を出すか. 端に触れている部屋は外側に通路をつくらない
+    single_line: 部屋が1行や1列しかないときに片側だけにする (Cityのみ)
+    """
+    iy, ix = np.indices((num_row_rooms, num_col_rooms))
+    first_y = iy == 0
+    last_y = iy == num_row_rooms - 1
+    first_x = ix == 0
+    last_x = ix == num_col_rooms - 1
+
+    conds = []
+    choices = []
+    if single_line:
+        conds += [(num_row_rooms == 1) & first_x, (num_row_rooms == 1) & last_x,
+                  (num_col_rooms == 1) & first_y, (num_col_rooms == 1) & last_y]
+        choices += [RIGHT, LEFT, DOWN, UP]
+    conds += [first_y & first_x, last_y & last_x, first_y & last_x, last_y & first_x,
+              first_y, last_y, first_x, last_x]
+    choices += [RIGHT|DOWN, LEFT|UP, LEFT|DOWN, RIGHT|UP,
+                LEFT|RIGHT|DOWN, LEFT|RIGHT|UP, RIGHT|UP|DOWN, LEFT|UP|DOWN]
+    return np.select(conds, choices, default=LEFT|RIGHT|UP|DOWN)
+
+def count_rooms(rooms):
+    """
+    draw_roomsで実際にマスができる部屋の数. 大きさが0の部屋は描かれないので数えない
+    """
+    return int(np.count_nonzero((rooms["half_x"] > 0) & (rooms["half_y"] > 0)))
+
+def draw_rooms(shape, rooms):
+    """
+    部屋のマスをTrueにした配列
+    部屋は重ならないので、四隅に±1を置いて縦横に累積和をとる
+    """
+    h, w = shape
+    y0 = (rooms["center_y"] - rooms["half_y"]).ravel()
+    y1 = (rooms["center_y"] + rooms["half_y"]).ravel()
+    x0 = (rooms["center_x"] - rooms["half_x"]).ravel()
+    x1 = (rooms["center_x"] + rooms["half_x"]).ravel()
+
+    corners = np.zeros((h + 1, w + 1), dtype=np.int8)
+    np.add.at(corners, (y0, x0), 1)
+    np.add.at(corners, (y0, x1), -1)
+    np.add.at(corners, (y1, x0), -1)
+    np.add.at(corners, (y1, x1), 1)
+    np.cumsum(corners, axis=0, out=corners)
+    np.cumsum(corners, axis=1, out=corners)
+    return corners[:h, :w] > 0
+
+def _expand_segments(fixed, start, stop):
+    """
+    [start, stop)の線分を、線分上の全マスの(固定の座標, 動く座標)に展開する
+    """
+    length = np.maximum(stop - start, 0)
+    offsets = start - (np.cumsum(length) - length)
+    return np.repeat(fixed, length), np.arange(length.sum()) + np.repeat(offsets, length)
+
+def draw_corridors(shape, rooms, exits):
+    """
+    通路のマスをTrueにした配列
+    各部屋から出した線と、それらを部屋の境界でつなぐ線を全部まとめて描く
+    """
+    cx = rooms["center_x"]
+    cy = rooms["center_y"]
+    rx = rooms["max_size_x"] // 2
+    ry = rooms["max_size_y"] // 2
+    col_idx = rooms["col_idx"]
+    row_idx = rooms["row_idx"]
+    has_left = (exits & LEFT) > 0
+    has_right = (exits & RIGHT) > 0
+    has_up = (exits & UP) > 0
+    has_down = (exits & DOWN) > 0
+
+    # 横の線 (行, 始点, 終点)
+    h_rows = [rooms["exit_left"][has_left], rooms["exit_right"][has_right]]
+    h_x0 = [(cx - rx)[has_left], cx[has_right]]
+    h_x1 = [cx[has_left], (cx + rx)[has_right]]
+    # 縦の線 (列, 始点, 終点)
+    v_cols = [rooms["exit_x_up"][has_up], rooms["exit_x_down"][has_down]]
+    v_y0 = [(cy - ry)[has_up], cy[has_down]]
+    v_y1 = [cy[has_up], (cy + ry)[has_down]]
+
+    # 線をつなげる
+    # 縦の境界では左の部屋の右の出口と右の部屋の左の出口をつなぐ
+    if len(col_idx) > 2:
+        ends = np.stack([rooms["exit_right"][:, :-1], rooms["exit_left"][:, 1:]])
+        v_cols.append(np.broadcast_to(col_idx[1:-1], ends.shape[1:]).ravel())
+        v_y0.append(ends.min(axis=0).ravel())
+        v_y1.append(ends.max(axis=0).ravel() + 1)
+    # 横の境界では上の部屋の下の出口と下の部屋の上の出口をつなぐ
+    if len(row_idx) > 2:
+        ends = np.stack([rooms["exit_x_down"][:-1, :], rooms["exit_x_up"][1:, :]])
+        h_rows.append(np.broadcast_to(row_idx[1:-1][:, None], ends.shape[1:]).ravel())
+        h_x0.append(ends.min(axis=0).ravel())
+        h_x1.append(ends.max(axis=0).ravel() + 1)
+
+    corridors = np.zeros(shape, dtype=bool)
+    ys, xs = _expand_segments(np.concatenate(h_rows), np.concatenate(h_x0), np.concatenate(h_x1))
+    corridors[ys, xs] = True
+    xs, ys = _expand_segments(np.concatenate(v_cols), np.concatenate(v_y0), np.concatenate(v_y1))
+    corridors[ys, xs] = True
+    return corridors
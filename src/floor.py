@@ -0,0 +1,68 @@
+"""
+次のフロアを別プロセスで先につくっておく
+フロアを切り替えるときは、できあがったものと入れ替えるだけになる
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import autotile
+import map_cache
+
+def create_floor(map_cls, w, h, num_enemies, seed, dungeon_kwargs, cache_dir=None):
+    """
+    地図, ゴール, 壁のタイル, 自キャラと敵の位置をまとめてつくる. 別プロセスで呼ばれる
+    すべて地図のseedから決まるので、同じseedなら同じフロアになる
+    """
+    map = map_cache.create_map_dungeon(map_cls, w, h, seed=seed, cache_dir=cache_dir, **dungeon_kwargs)
+    map.set_goal()
+
+    # 自キャラと敵が重ならないように一度に引く
+    cells = map.get_free_space(num=num_enemies + 1)
+    return {
+        "map": map,
+        "tile_map": autotile.create_tile_map(map.data), # 壁のタイルはフロアごとに一度だけ決める
+        "ego": cells[0],
+        "enemies": cells[1:],
+    }
+
+class FloorPrefetcher:
+    """
+    prefetch()で次のフロアをつくりはじめ、get()で受け取る
+    pyxel.initより前につくっておくこと (プロセスを先に立ち上げるため)
+    """
+    def __init__(self, map_cls, w, h, cache_dir=None, **dungeon_kwargs):
+        self.map_cls = map_cls
+        self.w = w
+        self.h = h
+        self.cache_dir = cache_dir # map_cacheに地図を残すならそのディレクトリ
+        self.dungeon_kwargs = dungeon_kwargs
+        self.executor = ProcessPoolExecutor(max_workers=1)
+        self.future = None
+        self.seed = None
+
+    def prefetch(self, num_enemies, seed=None):
+        if seed is None:
+            seed = np.random.randint(2**31 - 1)
+        self.seed = seed
+        self.future = self.executor.submit(create_floor, self.map_cls, self.w, self.h, num_enemies, seed, self.dungeon_kwargs, self.cache_dir)
+
+    def is_ready(self):
+        return self.future is not None and self.future.done()
+
+    def get(self, num_enemies):
+        """
+        先につくったフロアを返す. まだできていなければ待つ
+        prefetchしていないときや、敵の数が違うときはここでつくる
+        """
+        future = self.future
+        self.future = None
+        if future is not None:
+            floor = future.result()
+            if len(floor["enemies"]) == num_enemies:
+                return floor
+        seed = self.seed if future is not None else np.random.randint(2**31 - 1)
+        return create_floor(self.map_cls, self.w, self.h, num_enemies, seed, self.dungeon_kwargs, self.cache_dir)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
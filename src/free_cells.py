@@ -0,0 +1,68 @@
+"""
+空いているマスの集合. 追加, 削除, ランダムに選ぶのがどれもO(1) (num個選ぶのはO(num))
+
+cells[:n] に空いているマスの番号(y * w + x)を詰めて持ち、
+pos[番号] にそのマスがcellsの何番目にあるかを持つ. 集合になければ-1
+削除するときは最後の要素と入れ替えて縮めるので、穴があかない
+"""
+import numpy as np
+
+class FreeCells:
+    def __init__(self, free):
+        """
+        free: bool (h, w). Trueのマスを集合に入れる
+        """
+        self.h, self.w = free.shape
+        self.cells = np.flatnonzero(free)
+        self.n = len(self.cells)
+        self.pos = np.full(self.h * self.w, -1, dtype=np.int64)
+        self.pos[self.cells] = np.arange(self.n)
+
+    def __len__(self):
+        return self.n
+
+    def __contains__(self, yx):
+        return self.pos[yx[0] * self.w + yx[1]] >= 0
+
+    def remove(self, yx):
+        idx = yx[0] * self.w + yx[1]
+        i = self.pos[idx]
+        if i < 0:
+            return
+        # 最後の要素をあいた場所に移す
+        last = self.cells[self.n - 1]
+        self.cells[i] = last
+        self.pos[last] = i
+        self.pos[idx] = -1
+        self.n -= 1
+
+    def add(self, yx):
+        idx = yx[0] * self.w + yx[1]
+        if self.pos[idx] >= 0:
+            return
+        if self.n == len(self.cells):
+            # 足りなければ倍に広げる
+            self.cells = np.resize(self.cells, max(1, 2 * self.n))
+        self.cells[self.n] = idx
+        self.pos[idx] = self.n
+        self.n += 1
+
+    def sample(self, num, rng, replace=False):
+        """
+        num個選んで[(y, x), ...]で返す. replace=Falseなら重ならない
+        replace=Falseでも全体を並べかえず、先頭num個だけ入れ替える(途中までのFisher-Yates)のでO(num)
+        """
+        if replace:
+            idxs = self.cells[rng.integers(self.n, size=num)]
+        else:
+            if num > self.n:
+                raise ValueError(f"cannot take {num} cells from {self.n} free cells")
+            cells, pos = self.cells, self.pos
+            # k番目をk~n-1のどれかと入れ替える. posも一緒に直すので集合はそのまま
+            for k, j in enumerate(rng.integers(np.arange(num), self.n).tolist()):
+                a, b = cells[k], cells[j]
+                cells[k], cells[j] = b, a
+                pos[b], pos[a] = k, j
+            idxs = cells[:num]
+        y, x = np.divmod(idxs, self.w)
+        return list(zip(y.tolist(), x.tolist()))
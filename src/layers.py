@@ -0,0 +1,138 @@
+"""
+地図を種類ごとの層に分けて小さく持つ
+walls: np.uint8 (h, w). 1: 走行不可, 0: 走行可能
+poi: {(y, x): 値}. ゴール-1, スタート-2, 目的地番号[2,...]のように数マスしかないものだけ
+
+もとの np.int (8byte/マス) の data にくらべて1/8になる
+data[y, x] で読み書きしていたコードは DataView を通してそのまま動く
+DataViewで書きかえたときは map.invalidate() で地図のversionを増やす
+"""
+import numpy as np
+
+INT_TYPES = (int, np.integer)
+
+def split_layers(data):
+    """
+    もとの形式のdataをwallsとpoiに分ける
+    """
+    data = np.asarray(data)
+    walls = (data == 1).astype(np.uint8)
+    ys, xs = np.nonzero((data != 0) & (data != 1))
+    poi = {(y, x): int(data[y, x]) for y, x in zip(ys.tolist(), xs.tolist())}
+    return walls, poi
+
+class DataView:
+    """
+    wallsとpoiを重ねて、もとのdataと同じ値で読めるようにする
+    1マスの読み書きは配列をつくらない. それ以外は必要な範囲だけ配列にする
+    """
+    def __init__(self, map):
+        self.map = map
+
+    @property
+    def shape(self):
+        return self.map.walls.shape
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return np.dtype(np.int8)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _get_point(self, key):
+        """
+        1マスを指すkeyなら(y, x)を返す. 負のインデックスも直す
+        描画で毎フレーム全マス読まれるので、なるべく軽くする
+        """
+        if type(key) is not tuple or len(key) != 2:
+            return None
+        y, x = key
+        if not (isinstance(y, INT_TYPES) and isinstance(x, INT_TYPES)):
+            return None
+        if y < 0 or x < 0:
+            h, w = self.map.walls.shape
+            return (int(y) % h, int(x) % w)
+        return (y, x)
+
+    def __array__(self, dtype=None):
+        arr = self.map.walls.astype(np.int8)
+        for (y, x), v in self.map.poi.items():
+            arr[y, x] = v
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __getitem__(self, key):
+        yx = self._get_point(key)
+        if yx is not None:
+            v = self.map.poi.get(yx)
+            return int(self.map.walls[yx]) if v is None else v
+
+        # 矩形で切り出すときはその範囲のpoiだけ重ねる
+        if isinstance(key, tuple) and len(key) == 2 and all(isinstance(k, slice) for k in key):
+            arr = self.map.walls[key].astype(np.int8)
+            ys = range(*key[0].indices(self.shape[0]))
+            xs = range(*key[1].indices(self.shape[1]))
+            for (y, x), v in self.map.poi.items():
+                if y in ys and x in xs:
+                    arr[ys.index(y), xs.index(x)] = v
+            return arr
+
+        return np.asarray(self)[key]
+
+    def __setitem__(self, key, value):
+        yx = self._get_point(key)
+        if yx is not None:
+            yx = (int(yx[0]), int(yx[1]))
+            wall = 1 if value == 1 else 0
+            poi = None if value == 0 or value == 1 else int(value)
+            if self.map.walls[yx] == wall and self.map.poi.get(yx) == poi:
+                return
+            # 読み取り専用の地図(map_file)でも目印は置けるように, 壁が変わるときだけ書く
+            if self.map.walls[yx] != wall:
+                self.map.walls[yx] = wall
+            if poi is None:
+                self.map.poi.pop(yx, None)
+            else:
+                self.map.poi[yx] = poi
+            self.map.invalidate()
+            return
+
+        arr = np.asarray(self)
+        arr[key] = value
+        # setterを通してversionも増やす
+        self.map.data = arr
+
+    def __eq__(self, other):
+        return np.asarray(self) == other
+
+    def __ne__(self, other):
+        return np.asarray(self) != other
+
+    def __lt__(self, other):
+        return np.asarray(self) < other
+
+    def __le__(self, other):
+        return np.asarray(self) <= other
+
+    def __gt__(self, other):
+        return np.asarray(self) > other
+
+    def __ge__(self, other):
+        return np.asarray(self) >= other
+
+    def copy(self):
+        return np.asarray(self)
+
+    def __deepcopy__(self, memo):
+        # もとのdataと同じように配列のコピーを返す
+        return np.asarray(self)
+
+    def __repr__(self):
+        return repr(np.asarray(self))
+
+    def __str__(self):
+        return str(np.asarray(self))
@@ -3,25 +3,54 @@ import numpy as np
 from scipy.signal import convolve2d
 from scipy.ndimage.filters import minimum_filter, maximum_filter
 
+import dungeon
+import free_cells
+import layers
+import search
+
+# create_map_stick_downで柱を倒す向き [r,u,l,d]
+STICK_DOWN_DY = np.array([0, -1, 0, 1])
+STICK_DOWN_DX = np.array([1, 0, -1, 0])
+
 def dilation(arr, ksize=3):                
+    """
+    0のマスをまわりksize x ksizeに広げる
+    端からl, rマス以内の0は広げない
+    """
 
     ret_arr = np.copy(arr)
-    dilation_kernel = np.ones((ksize, ksize))
     if ksize % 2 == 0: 
         l = int(ksize / 2.0)
         r = int(ksize / 2.0)
     else:
         l = int(np.floor(ksize / 2.0))
         r = int(np.floor(ksize / 2.0))+1    
-            
-    for iy in range(l, arr.shape[0]-r):
-        for ix in range(l, arr.shape[1]-r):
-            if np.any(arr[iy, ix]==0):
-                ret_arr[iy-l:iy+r, ix-l:ix+r] = 0                            
+
+    h, w = arr.shape
+    if not (l < h - r and l < w - r):
+        return ret_arr
+
+    # 広げる元になる0のマス
+    src = np.zeros((h, w), dtype=bool)
+    src[l:h-r, l:w-r] = arr[l:h-r, l:w-r] == 0
+
+    # 正方形なので縦と横に分けてずらしながら重ねる
+    # 元のマスから -l ~ r-1 ずれたマスまで0になる
+    for axis in (0, 1):
+        n = src.shape[axis]
+        dst = np.zeros_like(src)
+        for d in range(-l, r):
+            if axis == 0:
+                dst[max(d, 0):n+min(d, 0)] |= src[max(-d, 0):n-max(d, 0)]
+            else:
+                dst[:, max(d, 0):n+min(d, 0)] |= src[:, max(-d, 0):n-max(d, 0)]
+        src = dst
+
+    ret_arr[src] = 0
     return ret_arr
 
 class Map:
-    def __init__(self, w, h, debug=False):
+    def __init__(self, w, h, debug=False, seed=None):
         super().__init__()
         """
         self.dataが地図
@@ -33,7 +62,10 @@ class Map:
         self.w = w
         self.h = h
 
-        self.data = np.zeros((h, w), np.int)
+        # 地図は壁と目印の層に分けて持つ. self.dataはそれを重ねて読むためのもの
+        self.walls = np.zeros((h, w), np.uint8)
+        self.poi = {} # {(y, x): -1 or -2 or 目的地番号}
+        self.data_view = layers.DataView(self)
     
         self.goal_x = None
         self.goal_y = None
@@ -41,26 +73,60 @@ class Map:
         self.start_y = None
         
         self.debug = debug         
+
+        # 地図づくりはこの乱数だけを使う. 同じseedなら同じ地図になる
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        # 地図を変えるたびに増やす. 経路のキャッシュはこれが変わったら捨てる
+        self.version = 0
+        self.path_cache = search.PathCache()
+
+        # 部屋の区切り. create_map_dungeonで決まる
+        self.room_row_idx = None
+        self.room_col_idx = None
+        self.num_rooms = None # create_map_dungeonで描いた部屋の数
+        self.room_graph = None # search_shortest_path_hierarchicalで使う
+        self.reachability = None # is_reachableで使う. versionが変わったらつくり直す
+        self.reachability_version = None
+        self.free_cells = None # get_free_spaceで使う. versionが変わったらつくり直す
+        self.free_cells_version = None
         
+    @property
+    def data(self):
+        """
+        wallsとpoiを重ねたもの. 1マスずつでも配列としても読み書きできる
+        """
+        return self.data_view
+
+    @data.setter
+    def data(self, data):
+        self.walls, self.poi = layers.split_layers(data)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        壁や目印を書きかえたときに呼ぶ. create_map_*とdataへの代入はここを通る
+        versionを増やして, 地図から求めたもの(経路, 部屋のグラフ, 到達判定, 空きマス)をまとめて捨てる
+        """
+        self.version += 1
+        self.path_cache.clear()
+        self.room_graph = None
+        self.reachability = None
+        self.free_cells = None
+        self.free_cells_version = None
+
     def create_map_stick_down(self):
+        self.invalidate()
         
         # 柱の設置
-        for i in range(1, self.w)[::2]:
-            for j in range(1, self.h)[::2]:
-                self.data[j, i] = 1 # occupied
+        self.walls[1::2, 1::2] = 1 # occupied
                 
-        # 柱を倒す
-        for i in range(1, self.w)[::2]:
-            for j in range(1, self.h)[::2]:
-                num = np.random.randint(3) # [r,u,l,d] = [0, 1, 2, 3]
-                if num == 0:
-                    self.data[j, i+1] = 1
-                elif num == 1:
-                    self.data[j-1, i] = 1
-                elif num ==2:
-                    self.data[j, i-1] = 1
-                elif num==3:
-                    self.data[j+1, i] = 1
+        # 柱を倒す. 向きは柱ごとに列, 行の順でまとめて引く
+        i = np.arange(1, self.w, 2)[:, None]
+        j = np.arange(1, self.h, 2)[None, :]
+        num = self.rng.integers(3, size=(i.shape[0], j.shape[1])) # [r,u,l,d] = [0, 1, 2, 3]
+        self.walls[j + STICK_DOWN_DY[num], i + STICK_DOWN_DX[num]] = 1
                     
     def create_map_dungeon(self, num_col_rooms=3, 
                            num_row_rooms=2, 
@@ -71,171 +137,161 @@ class Map:
         """
         TODO: 部屋を作らなば場合も実する。その場合、全部がつながっているかをチェックする関数をつくる
         """
+        self.invalidate()
 
-        self.data = np.ones(self.data.shape, np.int)
-        
         # 適当に配列を分割する
-        # NOTE: 各値は偶数でないと道がつながらない。
-        rand_col_idx = [ int(e)&~1 for e in np.linspace(0, self.w-1, num=int(num_col_rooms)+1)]
-        rand_row_idx = [ int(e)&~1 for e in np.linspace(0, self.h-1, num=int(num_row_rooms)+1).astype(np.int)]
-
-        # 各部屋の中心, 大きさ
-        num_col_rooms = len(rand_col_idx) - 1
-        num_row_rooms = len(rand_row_idx) - 1
-        room_max_size_x = np.zeros((num_row_rooms, num_col_rooms),np.int)
-        room_max_size_y = np.zeros((num_row_rooms, num_col_rooms),np.int)
-        room_center_x = np.zeros((num_row_rooms, num_col_rooms), np.int)
-        room_center_y = np.zeros((num_row_rooms, num_col_rooms),np.int)
-
-        for ic in range(len(rand_col_idx)-1):
-            for ir in range(len(rand_row_idx)-1):
-                x = int(0.5 * (rand_col_idx[ic] + rand_col_idx[ic+1]))
-                size_x = rand_col_idx[ic+1] - rand_col_idx[ic]
-                y = int(0.5 * (rand_row_idx[ir] + rand_row_idx[ir+1]))
-                size_y = rand_row_idx[ir+1] - rand_row_idx[ir]
-
-                room_center_y[ir, ic] = int(y)
-                room_max_size_y[ir, ic] = int(size_y)
-                room_center_x[ir, ic] = int(x)
-                room_max_size_x[ir, ic] = int(size_x)
-        
-        # 各部屋の大きさを決める
-        room_size_x = np.zeros((num_row_rooms, num_col_rooms))
-        room_size_y = np.zeros((num_row_rooms, num_col_rooms))
-        for iy in range(num_row_rooms):
-            for ix in range(num_col_rooms):            
-                rmsx = room_max_size_x[iy,ix]
-                rmsy = room_max_size_y[iy,ix]
-                
-                rsx = np.random.randint(int(rmsx * min_room_size_ratio), int(rmsx * max_room_size_ratio))
-                rsy = np.random.randint(int(rmsy * min_room_size_ratio), int(rmsy * max_room_size_ratio))
-                room_size_x[iy, ix] = rsx
-                room_size_y[iy, ix] = rsy
-    
+        rand_row_idx, rand_col_idx = dungeon.split_rooms(self.h, self.w, num_col_rooms, num_row_rooms)
+        self.room_row_idx = rand_row_idx
+        self.room_col_idx = rand_col_idx
+
+        # 各部屋の中心, 大きさ, 通路への出口
+        rooms = dungeon.create_rooms(rand_row_idx, rand_col_idx, min_room_size_ratio, max_room_size_ratio, rng=self.rng)
+        self.num_rooms = dungeon.count_rooms(rooms)
+        exits = dungeon.get_exits(len(rand_row_idx)-1, len(rand_col_idx)-1, single_line=False)
+
         # 各部屋を塗りつぶす + 通路をつくる
-        for iy in range(num_row_rooms):
-            for ix in range(num_col_rooms):            
-                w = room_size_x[iy, ix]
-                h = room_size_y[iy, ix]
-                cx = room_center_x[iy, ix]
-                cy = room_center_y[iy, ix]                
-                rmsx = room_max_size_x[iy,ix]
-                rmsy = room_max_size_y[iy,ix]
-                self.data[cy-int(h/2.0):cy+int(h/2.0), cx-int(w/2.0):cx+int(w/2.0)] = 0
-        
-                # 各部かから通路への垂線を上下左右４本分生成
-                exit_x_up = np.random.randint(cx-int(w/2.0)+1, cx+int(w/2.0)-1)
-                exit_x_down = np.random.randint(cx-int(w/2.0)+1, cx+int(w/2.0)-1)
-                exit_left = np.random.randint(cy-int(h/2.0)+1, cy+int(h/2.0)-1)
-                exit_right = np.random.randint(cy-int(h/2.0)+1, cy+int(h/2.0)-1)
-                
-                # cxからcx+rmsx/2.0, cx-rmsx/2.0だけ線を引く
-                # ただし, 端に触れていへ部屋は通路をつくらない
-                
-                rx = int(rmsx/2.0)
-                ry = int(rmsy/2.0)
-                
-                if iy == 0 and ix == 0:
-                    self.data[exit_right, cx:cx+rx] = 0
-                    self.data[cy:cy+ry, exit_x_down] = 0
-
-                elif iy == num_row_rooms-1 and ix == num_col_rooms-1:
-                    self.data[exit_left, cx-rx:cx] = 0
-                    self.data[cy-ry:cy, exit_x_up] = 0
-
-                elif iy == 0 and ix == num_col_rooms-1:
-                    self.data[exit_left, cx-rx:cx] = 0
-                    self.data[cy:cy+ry, exit_x_down] = 0
-
-                elif iy == num_row_rooms-1 and ix == 0:
-                    self.data[exit_right, cx:cx+rx] = 0
-                    self.data[cy-ry:cy, exit_x_up] = 0
-
-                elif iy == num_row_rooms-1 and ix == 0:
-                    self.data[exit_right, cx:cx+rx] = 0
-                    self.data[cy-ry:cy, exit_x_up] = 0
-
-                elif iy == 0:
-                    self.data[exit_left, cx-rx:cx] = 0
-                    self.data[exit_right, cx:cx+rx] = 0
-                    self.data[cy:cy+ry, exit_x_down] = 0
-
-                elif iy == num_row_rooms-1:
-                    self.data[exit_left, cx-rx:cx] = 0
-                    self.data[exit_right, cx:cx+rx] = 0
-                    self.data[cy-ry:cy, exit_x_up] = 0
-
-                elif ix == 0:
-                    self.data[exit_right, cx:cx+rx] = 0
-                    self.data[cy-ry:cy, exit_x_up] = 0
-                    self.data[cy:cy+ry, exit_x_down] = 0
-
-                elif ix == num_col_rooms-1:
-                    self.data[exit_left, cx-rx:cx] = 0
-                    self.data[cy-ry:cy, exit_x_up] = 0
-                    self.data[cy:cy+ry, exit_x_down] = 0
-                            
-                else:                
-                    self.data[exit_left, cx-rx:cx] = 0
-                    self.data[exit_right, cx:cx+rx] = 0
-                    self.data[cy-ry:cy, exit_x_up] = 0
-                    self.data[cy:cy+ry, exit_x_down] = 0
-
-        # 線をつなげる
-        rand_col_idx = np.array(rand_col_idx)
-        for col_idx in rand_col_idx[1:-1]:
-            end_y_l = np.where(self.data[:, col_idx - 1]== 0 )
-            end_y_r = np.where(self.data[:, col_idx + 1]== 0 )
-            for idx in range(num_row_rooms):
-                end_y = sorted([end_y_l[0][idx], end_y_r[0][idx]])
-                self.data[end_y[0]:end_y[1]+1, col_idx] = 0                
-
-        rand_row_idx = np.array(rand_row_idx)
-        for row_idx in rand_row_idx[1:-1]:
-            end_x_u = np.where(self.data[row_idx - 1, :]== 0 )
-            end_x_d = np.where(self.data[row_idx + 1, :]== 0 )
-            for idx in range(num_col_rooms):
-                end_x = sorted([end_x_u[0][idx], end_x_d[0][idx]])
-                self.data[row_idx, end_x[0]:end_x[1]+1] = 0                
+        # ただし, 端に触れてい部屋は通路をつくらない
+        free = dungeon.draw_rooms((self.h, self.w), rooms)
+        free |= dungeon.draw_corridors((self.h, self.w), rooms, exits)
+        self.walls = (~free).astype(np.uint8)
+        self.poi = {}
 
         if corrider_width > 1:            
-            self.data = dilation(self.data, ksize=corrider_width)
+            self.walls = dilation(self.walls, ksize=corrider_width)
 
-    def set_start(self):
+    def get_free_cells(self):
+        """
+        空いているマスの集合. 壁と目印のマスは入らない. 地図が変わったらつくり直す
+        """
+        if self.free_cells_version != self.version:
+            free = self.walls == 0
+            for yx in self.poi:
+                free[yx] = False
+            self.free_cells = free_cells.FreeCells(free)
+            self.free_cells_version = self.version
+        return self.free_cells
+
+    def get_free_space(self, num=1, replace=False):
+        """
+        空いているマスからnumマス選ぶ. replace=Falseなら重ならない
+        """
+        return self.get_free_cells().sample(num, self.rng, replace=replace)
 
-        # 地図中にスタートがあれば通路0に置き換え
-        self.data = np.where(self.data == -2, 0, self.data)
-        
-        # 通路0を引くまでランダムに選択する
-        x = np.random.randint(self.w)
-        y = np.random.randint(self.h)        
-        while self.data[y, x] != 0 and self.data[y, x] != -1:
-            x = np.random.randint(self.w)
-            y = np.random.randint(self.h)        
-
-        self.data[y, x] = -2 # Start
-        self.start_x = x
-        self.start_y = y
+    def remove_marker(self, y, x, value):
+        """
+        (y, x)の目印valueを消して空きマスに戻す. 目印が書きかえられていたら何もしない
+        """
+        if y is None or self.poi.get((y, x)) != value:
+            return
+        del self.poi[(y, x)]
+        if self.free_cells_version == self.version and self.walls[y, x] == 0:
+            self.free_cells.add((y, x))
+
+    def put_marker(self, value):
+        """
+        空いているマスをひとつ選んで目印valueを置く
+        """
+        y, x = self.get_free_space(num=1)[0]
+        self.free_cells.remove((y, x))
+        self.poi[(y, x)] = value
+        return y, x
+
+    def set_start(self):
+        # 前のスタートだけ通路0に戻す. 壁は変わらないのでversionは増やさない
+        self.remove_marker(self.start_y, self.start_x, -2)
+        self.start_y, self.start_x = self.put_marker(-2) # Start
         
     def set_goal(self):
-        # 地図中にゴールがあれば通路0に置き換え
-        self.data = np.where(self.data == -1, 0, self.data)
-
-        x = np.random.randint(self.w)
-        y = np.random.randint(self.h)        
-        while self.data[y, x] != 0 and self.data[y, x] != -2:
-            x = np.random.randint(self.w)
-            y = np.random.randint(self.h)        
-
-        self.data[y, x] = -1 # Goal
-        self.goal_x = x
-        self.goal_y = y
+        # 前のゴールだけ通路0に戻す
+        self.remove_marker(self.goal_y, self.goal_x, -1)
+        self.goal_y, self.goal_x = self.put_marker(-1) # Goal
  
+    def is_reachable(self, start, goal):
+        """
+        start = (y, x)
+        goal = (y, x)
+        壁で塞がれていなければTrue. 連結成分のラベルを引くだけなのでO(1)
+        """
+        if self.reachability is None or self.reachability_version != self.version:
+            self.reachability = search.Reachability(self.walls == 1)
+            self.reachability_version = self.version
+        return self.reachability.is_reachable(start, goal)
+
+    def search_shortest_path(self, start, goal, method="bfs"):
+        """
+        start = (y, x)
+        goal = (y, x)
+        method = "bfs" : search_shortest_path_dwsと同じ経路をキューで探索する
+                 "astar" : マンハッタン距離のA*. 経路の長さはbfsと同じ
+        goalに到達できなければNone
+        同じstart, goalの結果はpath_cacheに残しておく
+        """
+        key = (int(start[0]), int(start[1]), int(goal[0]), int(goal[1]), method)
+        route = self.path_cache.get(key, self.version)
+        if route is None:
+            # キャッシュになかったときだけ、行けるかを先に調べる
+            if not self.is_reachable(start, goal):
+                return None
+            barrier = search.get_barrier(self.walls, start, goal)
+            route = search.search_shortest_path(barrier, start, goal, method=method)
+            if route is None:
+                return None
+            self.path_cache.put(key, route)
+        return list(route)
+
+    def search_shortest_path_bounded(self, start, goal, radius, max_expansions=None):
+        """
+        start = (y, x)
+        goal = (y, x)
+        startから上下左右radiusマスの窓の中だけを探索する. 地図の大きさによらずO(radius^2)
+        max_expansionsを与えるとそれだけマスを展開したところで諦める
+        窓の中で行けなければNone
+        """
+        return search.search_bounded(self.walls, start, goal, radius, max_expansions=max_expansions)
+
+    def search_many(self, starts, goals):
+        """
+        starts = [(y, x), ...]
+        goals = [(y, x), ...]
+        複数キャラの経路を1回の呼び出しで探す. startかgoalが同じキャラは探索を1回で済ませる
+        starts, goalsと同じ順に経路を返す. 到達できなければNone
+        """
+        return search.search_many(self.walls, starts, goals)
+
+    def get_distance_field(self, goal):
+        """
+        goal = (y, x)
+        全マスについてgoalまでの歩数を求める. 到達できないマスはsearch.UNREACHABLE
+        同じgoalを目指すキャラが何体いても探索は1回で済み、
+        各キャラの経路はsearch.descend(cost, (y, x))で取り出せる
+        """
+        barrier = search.get_barrier(self.walls, goal, goal)
+        return search.search_cost_bfs(barrier, goal)
+
+    def search_shortest_path_hierarchical(self, start, goal):
+        """
+        start = (y, x)
+        goal = (y, x)
+        部屋を節点にしたグラフで探してから、通る部屋の中だけ経路を求める
+        地図が大きくても探索するのは通る部屋だけになるが、最短とは限らない
+        goalに到達できなければNone
+        """
+        if self.room_graph is None:
+            # 部屋の区切りがなければ16マスごとに区切る
+            row_idx = self.room_row_idx if self.room_row_idx is not None else range(0, self.h, 16)
+            col_idx = self.room_col_idx if self.room_col_idx is not None else range(0, self.w, 16)
+            self.room_graph = search.RoomGraph(self.walls == 1, row_idx, col_idx)
+        return self.room_graph.search(start, goal)
+
     def search_shortest_path_dws(self, start, goal):
         """
         start = (y, x)
         goal = (y, x)
         """
+        # 行けない場合は999回まわったあと、経路を戻るところで止まらなくなるので先に調べる
+        if not self.is_reachable(start, goal):
+            return None
+
         import matplotlib.pyplot as plt
         import matplotlib.cm as cm
         import matplotlib.colors as colors
@@ -261,7 +317,7 @@ class Map:
                     start_goal[iy, ix] = -255
                 if iy == goal[0] and ix == goal[1]:                
                     start_goal[iy, ix] = 255
-                if self.data[iy, ix] == 1: # barrier
+                if self.walls[iy, ix] == 1: # barrier
                     barrier[iy, ix] = True 
 
         # print('start\n{}'.format(start))
@@ -0,0 +1,42 @@
+"""
+seedと地図の設定が同じならcreate_map_dungeonの結果も同じなので、ファイルに保存して使い回す
+2回目からは生成せずに読みこむだけになる
+
+map = map_cache.create_map_dungeon(City, 256, 256, seed=0, num_col_rooms=6, num_row_rooms=6)
+"""
+import inspect
+import os
+
+import map_file
+
+CACHE_DIR = "map_cache"
+
+def get_key(map_cls, w, h, seed, **kwargs):
+    """
+    キャッシュのファイル名. 省略された引数はcreate_map_dungeonのデフォルト値にそろえる
+    """
+    args = inspect.signature(map_cls.create_map_dungeon).bind(None, **kwargs)
+    args.apply_defaults()
+    args = [args.arguments[k] for k in ["num_col_rooms", "num_row_rooms", "corrider_width", "min_room_size_ratio", "max_room_size_ratio"]]
+    return f"{map_cls.__name__}_{seed}_{w}x{h}_" + "_".join(str(e) for e in args) + ".pxmap"
+
+def create_map_dungeon(map_cls, w, h, seed=None, cache_dir=CACHE_DIR, **kwargs):
+    """
+    キャッシュがあれば読みこみ、なければつくって保存する
+    seedがNoneのときは毎回違う地図なので保存しない
+    """
+    if seed is None or cache_dir is None:
+        map = map_cls(w, h, seed=seed)
+        map.create_map_dungeon(**kwargs)
+        return map
+
+    path = os.path.join(cache_dir, get_key(map_cls, w, h, seed, **kwargs))
+    if os.path.exists(path):
+        # 書きかえてもキャッシュのファイルは変わらないようにする
+        return map_file.load(path, map_cls, mode="c")
+
+    map = map_cls(w, h, seed=seed)
+    map.create_map_dungeon(**kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    map_file.save(map, path)
+    return map
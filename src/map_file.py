@@ -0,0 +1,121 @@
+"""
+City/Mapをバイナリで保存して、np.memmapで読みこむ
+読みこみはファイルを割り当てるだけでコピーしないので、大きな地図でもすぐ開ける
+mode="r"で開けば複数のプロセスで同じ地図を読み取り専用で共有できる
+
+ファイルの形式
+    MAGIC (8byte)
+    ヘッダの長さ (uint64, little endian)
+    ヘッダ (json, utf-8). 形式のバージョン, 地図の情報, 各層の位置と型
+    各層の配列 (C順). 先頭はALIGNbyteにそろえる
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from city import City
+from map import Map
+
+MAGIC = b"PXLMAP\0\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+MAP_CLASSES = {"City": City, "Map": Map}
+
+# 配列として保存するメンバ. 地図として変わらないものだけ
+# occupancuyのようにゲーム中に書きかえるものは保存せず、読みこむときに新しくつくる
+LAYERS = ["walls"]
+
+# jsonで保存するdict. キーはboolのこともあるので[キー, 値]のリストにする
+TABLES = ["locations", "dumpings", "loadings"]
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+def save(map, path):
+    header = {
+        "format_version": FORMAT_VERSION,
+        "class": type(map).__name__,
+        "w": map.w,
+        "h": map.h,
+        "seed": map.seed,
+        "start": [map.start_y, map.start_x],
+        "goal": [map.goal_y, map.goal_x],
+        "room_row_idx": None if map.room_row_idx is None else [int(e) for e in map.room_row_idx],
+        "room_col_idx": None if map.room_col_idx is None else [int(e) for e in map.room_col_idx],
+        "rng": map.rng.bit_generator.state,
+        "poi": [[y, x, v] for (y, x), v in map.poi.items()],
+        "tables": {},
+        "layers": {},
+    }
+    for name in TABLES:
+        if hasattr(map, name):
+            header["tables"][name] = [[k, list(v)] for k, v in getattr(map, name).items()]
+
+    # ヘッダの長さが決まらないと配列の位置が決まらないので、位置は0からの相対で持つ
+    arrays = [(name, np.ascontiguousarray(getattr(map, name))) for name in LAYERS if hasattr(map, name)]
+    offset = 0
+    for name, arr in arrays:
+        header["layers"][name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset = _align(offset + arr.nbytes)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    # 途中で止まっても壊れたファイルが残らないように一度別名で書く
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in arrays:
+            f.seek(data_start + header["layers"][name]["offset"])
+            f.write(arr.tobytes())
+    os.replace(tmp_path, path)
+
+def read_header(path):
+    """
+    ヘッダと配列の先頭位置を返す
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a map file")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    if header["format_version"] > FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported format version {header['format_version']}")
+    return header, _align(len(MAGIC) + 8 + header_len)
+
+def load(path, map_cls=None, mode="r"):
+    """
+    mode: np.memmapのmode
+        "r": 読み取り専用. 複数のプロセスで共有できる. 壁は書きかえられない
+            occupancuyは読みこむたびにnp.zerosでつくるので、occupy/releaseはできる
+        "c": 書きかえてもファイルには反映しない
+        "r+": 書きかえたらファイルにも反映する
+    """
+    header, data_start = read_header(path)
+    if map_cls is None:
+        map_cls = MAP_CLASSES[header["class"]]
+
+    map = map_cls(header["w"], header["h"], seed=header["seed"])
+    map.version += 1
+    for name, layer in header["layers"].items():
+        if name not in LAYERS:
+            # 前の形式で保存されたoccupancuyなど. __init__でつくった書きこめる配列を使う
+            continue
+        arr = np.memmap(path, dtype=np.dtype(layer["dtype"]), mode=mode,
+                        offset=data_start + layer["offset"], shape=tuple(layer["shape"]))
+        setattr(map, name, arr)
+
+    map.poi = {(y, x): v for y, x, v in header["poi"]}
+    map.start_y, map.start_x = header["start"]
+    map.goal_y, map.goal_x = header["goal"]
+    map.room_row_idx = header["room_row_idx"]
+    map.room_col_idx = header["room_col_idx"]
+    map.rng.bit_generator.state = header["rng"]
+    for name, items in header["tables"].items():
+        setattr(map, name, {k: tuple(v) for k, v in items})
+    return map
@@ -0,0 +1,98 @@
+"""
+地図を画像バンクに一度だけ描いておき、毎フレームはblt一回で描く
+地図が変わったときだけ描き直すので、マスごとにpyxel.rectを呼ばなくてよくなる
+
+    self.map_layer = MapLayer({0: 5, -1: 8}, MAP_IMAGE_BANK)
+    ...
+    self.map_layer.draw(self.map, 0, 0) # drawの中で
+"""
+import numpy as np
+import pyxel
+
+HEX = np.array(list("0123456789abcdef"))
+
+# my_resource.pyxresはimage0(タイル, キャラ)とimage1を使っている. 2は空いているので地図を描いておく
+# 使う画像を足すときはここも見直すこと. MapLayerとMinimapを同じAppで使うときは別のバンクにする
+MAP_IMAGE_BANK = 2
+IMAGE_SIZE = 256 # 画像バンクの大きさ. これより大きい地図はマスごとに描く
+
+def fits_image(map):
+    return map.w <= IMAGE_SIZE and map.h <= IMAGE_SIZE
+
+def get_screen_range(x, y, w, h):
+    """
+    (x, y)に置いたw x hのうち画面に入るマスの範囲 (y0, y1, x0, x1)
+    """
+    x0, y0 = max(0, -x), max(0, -y)
+    x1, y1 = min(w, pyxel.width - x), min(h, pyxel.height - y)
+    return y0, max(y0, y1), x0, max(x0, x1)
+
+def draw_cells(colors, x, y, colkey):
+    """
+    画像バンクに入らないときの描き方. colkeyでないマスをpyxel.rectで描く
+    colors: (h, w)の色の配列
+    """
+    rect = pyxel.rect
+    ys, xs = np.nonzero(colors != colkey)
+    for cy, cx, c in zip(ys.tolist(), xs.tolist(), colors[ys, xs].tolist()):
+        rect(x + cx, y + cy, 1, 1, c)
+
+def get_color_table(colors, colkey):
+    """
+    dataの値(-128~127) -> 色の表. colorsにない値はcolkey(透明)
+    """
+    table = np.full(256, colkey, dtype=np.uint8)
+    for value, color in colors.items():
+        table[value + 128] = color
+    return table
+
+def to_image_data(colors):
+    """
+    色の配列をImage.setに渡す文字列のリストにする
+    """
+    return ["".join(row) for row in HEX[colors].tolist()]
+
+class MapLayer:
+    def __init__(self, colors, img, colkey=0):
+        """
+        colors: {dataの値: 色}. 壁のように書かないマスはcolkeyになり、bltで透明になる
+        img: 描いておく画像バンク. ほかで使っていないもの(ふつうはMAP_IMAGE_BANK)にする
+        """
+        self.table = get_color_table(colors, colkey)
+        self.img = img
+        self.colkey = colkey
+        self.key = None # 最後に描いた地図
+
+    def get_key(self, map):
+        # 壁が変わればversion, 目印が動けばpoiが変わる
+        return (id(map), map.version, frozenset(map.poi.items()))
+
+    def invalidate(self):
+        """
+        versionを変えずに地図を書きかえたときに呼ぶ
+        """
+        self.key = None
+
+    def get_colors(self, map, y0=0, y1=None, x0=0, x1=None):
+        return self.table[np.asarray(map.data[y0:y1, x0:x1]).astype(np.int16) + 128]
+
+    def update(self, map):
+        key = self.get_key(map)
+        if key == self.key:
+            return
+        if not fits_image(map):
+            raise ValueError(f"map is too large for an image bank: {map.w}x{map.h}")
+        pyxel.image(self.img).set(0, 0, to_image_data(self.get_colors(map)))
+        self.key = key
+
+    def draw(self, map, x, y):
+        """
+        地図が変わっていれば描き直してから、(x, y)にblt一回で描く
+        画像バンクに入らない地図は、画面に入るところだけマスごとに描く
+        """
+        if not fits_image(map):
+            y0, y1, x0, x1 = get_screen_range(x, y, map.w, map.h)
+            draw_cells(self.get_colors(map, y0, y1, x0, x1), x + x0, y + y0, self.colkey)
+            return
+        self.update(map)
+        pyxel.blt(x, y, self.img, 0, 0, map.w, map.h, self.colkey)
@@ -0,0 +1,70 @@
+"""
+見たことのある通路だけを描くスモールマップ
+画像バンクに描きためておき、新しく見えたマスだけ描き足す. 毎フレームはblt一回
+画像バンクに入らない地図は、描いたマスを覚えておいて画面に入るところをマスごとに描く
+
+    self.minimap = Minimap(MAP_IMAGE_BANK)
+"""
+import numpy as np
+import pyxel
+
+from map_layer import to_image_data, fits_image, get_screen_range, draw_cells
+
+class Minimap:
+    def __init__(self, img, color=5, colkey=0):
+        """
+        img: 描きためておく画像バンク. ほかで使っていないもの(ふつうはMAP_IMAGE_BANK)にする
+        color: 見たことのある通路の色. それ以外はcolkey(透明)
+        """
+        self.img = img
+        self.color = color
+        self.colkey = colkey
+        self.map = None
+        self.painted = None # 描いたマス
+        self.use_image = True # Falseなら画像バンクに入らないのでマスごとに描く
+
+    def reset(self, map):
+        """
+        フロアが変わったら全部消す
+        """
+        self.map = map
+        self.painted = np.zeros((map.h, map.w), dtype=bool)
+        self.use_image = fits_image(map)
+        if self.use_image:
+            pyxel.image(self.img).set(0, 0, to_image_data(np.full((map.h, map.w), self.colkey, dtype=np.uint8)))
+
+    def reveal(self, map, is_seen, y0, y1, x0, x1):
+        """
+        [y0, y1) x [x0, x1)の中で新しく見えた通路を描き足す
+        """
+        if map is not self.map:
+            self.reset(map)
+        y0, x0 = max(y0, 0), max(x0, 0)
+        y1, x1 = min(y1, map.h), min(x1, map.w)
+        if y0 >= y1 or x0 >= x1:
+            return
+
+        painted = self.painted[y0:y1, x0:x1]
+        new = is_seen[y0:y1, x0:x1] & ~painted & (map.data[y0:y1, x0:x1] == 0)
+        if not new.any():
+            return
+        painted |= new
+        if not self.use_image:
+            return
+
+        # 新しいマスを囲む矩形だけ描き直す
+        ys, xs = np.nonzero(new)
+        by0, by1 = ys.min(), ys.max() + 1
+        bx0, bx1 = xs.min(), xs.max() + 1
+        colors = np.where(painted[by0:by1, bx0:bx1], self.color, self.colkey).astype(np.uint8)
+        pyxel.image(self.img).set(int(x0 + bx0), int(y0 + by0), to_image_data(colors))
+
+    def draw(self, x, y):
+        if self.map is None:
+            return
+        if not self.use_image:
+            y0, y1, x0, x1 = get_screen_range(x, y, self.map.w, self.map.h)
+            colors = np.where(self.painted[y0:y1, x0:x1], self.color, self.colkey)
+            draw_cells(colors, x + x0, y + y0, self.colkey)
+            return
+        pyxel.blt(x, y, self.img, 0, 0, self.map.w, self.map.h, self.colkey)
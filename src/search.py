@@ -0,0 +1,916 @@
+import heapq
+from bisect import bisect_right
+from collections import deque, OrderedDict
+
+import numpy as np
+from scipy.ndimage import label
+
+# 到達できないマスのコスト
+UNREACHABLE = np.iinfo(np.int32).max
+
+def get_barrier(data, start, goal, occupancy=None):
+    """
+    走行不可のマスをTrueにした配列を返す
+    occupancyが与えられればキャラがいるマスも障害物とする
+    ただし start, goal は障害物としない
+    """
+    barrier = data == 1
+    if occupancy is not None:
+        barrier = barrier | occupancy
+    barrier[start[0], start[1]] = False
+    barrier[goal[0], goal[1]] = False
+    return barrier
+
+def search_cost_bfs(barrier, start, goal=None, goals=None, max_expansions=None, terminals=None):
+    """
+    startからのコスト(歩数)をキューで幅優先に求める
+    goalが与えられればgoalに到達した時点で打ち切る
+    goalsが与えられれば全てに到達した時点で打ち切る
+    max_expansionsが与えられればその数のマスを展開した時点で打ち切る
+    terminalsのマスは障害物でもコストはつけるが、そこから先へは広げない(通り抜けられない)
+    到達できないマスのコストはUNREACHABLE
+
+    start = (y, x)
+    goal = (y, x)
+    goals = [(y, x), ...]
+    terminals = [(y, x), ...]
+    """
+    h, w = barrier.shape
+    size = h * w
+    free = (~barrier).ravel().tolist()
+    cost = [UNREACHABLE] * size
+    stops = set()
+    if terminals is not None:
+        for t in terminals:
+            i = t[0] * w + t[1]
+            free[i] = True
+            stops.add(i)
+
+    s = start[0] * w + start[1]
+    targets = set()
+    if goal is not None:
+        targets.add(goal[0] * w + goal[1])
+    if goals is not None:
+        targets.update(g[0] * w + g[1] for g in goals)
+    cost[s] = 0
+    queue = deque([s])
+    expansions = 0
+    while queue:
+        idx = queue.popleft()
+        if idx in targets:
+            targets.discard(idx)
+            if len(targets) == 0:
+                break
+        if stops and idx in stops:
+            continue
+        if max_expansions is not None:
+            if expansions >= max_expansions:
+                break
+            expansions += 1
+        c = cost[idx] + 1
+        # 上下左右
+        if idx >= w and free[idx - w] and cost[idx - w] == UNREACHABLE:
+            cost[idx - w] = c
+            queue.append(idx - w)
+        if idx + w < size and free[idx + w] and cost[idx + w] == UNREACHABLE:
+            cost[idx + w] = c
+            queue.append(idx + w)
+        if idx % w and free[idx - 1] and cost[idx - 1] == UNREACHABLE:
+            cost[idx - 1] = c
+            queue.append(idx - 1)
+        if (idx + 1) % w and free[idx + 1] and cost[idx + 1] == UNREACHABLE:
+            cost[idx + 1] = c
+            queue.append(idx + 1)
+
+    return np.array(cost, dtype=np.int32).reshape(h, w)
+
+def backtrack(cost, goal):
+    """
+    goalからコストが1ずつ減るマスをたどってstartまでの経路を返す
+    上下左右の順に調べるのはsearch_shortest_path_dwsと同じ
+    goalに到達できなければNone
+    """
+    h, w = cost.shape
+    cost_now = cost[goal[0], goal[1]]
+    if cost_now == UNREACHABLE:
+        return None
+
+    point_now = (int(goal[0]), int(goal[1]))
+    route = [point_now]
+    while cost_now > 0:
+        for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            y = point_now[0] + dy
+            x = point_now[1] + dx
+            if 0 <= y < h and 0 <= x < w and cost[y, x] == cost_now - 1:
+                point_now = (y, x)
+                cost_now = cost_now - 1
+                route.append(point_now)
+
+    #ルートを逆順にする
+    return route[::-1]
+
+def search_bfs(barrier, start, goal):
+    """
+    幅優先探索による最短経路
+    search_shortest_path_dwsと同じ経路を返す
+    """
+    cost = search_cost_bfs(barrier, start, goal)
+    return backtrack(cost, goal)
+
+def search_astar(barrier, start, goal):
+    """
+    マンハッタン距離をヒューリスティックにしたA*による最短経路
+    経路の長さはsearch_bfsと同じだが、同じ長さの経路のうちどれを選ぶかは異なることがある
+    goalに到達できなければNone
+    """
+    h, w = barrier.shape
+    size = h * w
+    free = (~barrier).ravel().tolist()
+    cost = [UNREACHABLE] * size
+    came_from = [-1] * size
+
+    s = start[0] * w + start[1]
+    g = goal[0] * w + goal[1]
+    gy, gx = int(goal[0]), int(goal[1])
+    cost[s] = 0
+    # (f, -g, idx) fが同じならgoalに近い方を先に展開する
+    open_list = [(abs(gy - start[0]) + abs(gx - start[1]), 0, s)]
+    while open_list:
+        _, neg_c, idx = heapq.heappop(open_list)
+        if idx == g:
+            break
+        if -neg_c > cost[idx]:
+            continue # 更新済みの古い要素
+        c = cost[idx] + 1
+        y, x = divmod(idx, w)
+        for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+            if 0 <= ny < h and 0 <= nx < w:
+                nidx = ny * w + nx
+                if free[nidx] and c < cost[nidx]:
+                    cost[nidx] = c
+                    came_from[nidx] = idx
+                    heapq.heappush(open_list, (c + abs(gy - ny) + abs(gx - nx), -c, nidx))
+
+    if cost[g] == UNREACHABLE:
+        return None
+
+    route = []
+    idx = g
+    while idx != -1:
+        route.append(divmod(idx, w))
+        idx = came_from[idx]
+    return route[::-1]
+
+def next_step(cost, point):
+    """
+    pointの上下左右のうちコストが最も小さいマスを返す
+    pointより小さいマスがなければNone
+    """
+    h, w = cost.shape
+    best = None
+    best_cost = cost[point[0], point[1]]
+    for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        y = point[0] + dy
+        x = point[1] + dx
+        if 0 <= y < h and 0 <= x < w and cost[y, x] < best_cost:
+            best = (y, x)
+            best_cost = cost[y, x]
+    return best
+
+def descend(cost, start, origin=(0, 0)):
+    """
+    search_cost_bfsで求めたコストを小さい方へたどり、コスト0のマスまでの経路を返す
+    コストを一度求めておけば、同じgoalを目指すキャラごとに探索しなくてよい
+    costが窓(search_cost_bounded)のときはoriginに窓の左上を与える
+    startから到達できなければNone
+    """
+    h, w = cost.shape
+    point_now = (int(start[0]) - origin[0], int(start[1]) - origin[1])
+    if not (0 <= point_now[0] < h and 0 <= point_now[1] < w):
+        return None
+    if cost[point_now[0], point_now[1]] == UNREACHABLE:
+        return None
+
+    route = [point_now]
+    while cost[point_now[0], point_now[1]] > 0:
+        point_now = next_step(cost, point_now)
+        route.append(point_now)
+    return [(y + origin[0], x + origin[1]) for y, x in route]
+
+def get_window(shape, point, radius):
+    """
+    pointを中心に上下左右radiusマスの範囲 (y0, y1, x0, x1)
+    """
+    h, w = shape
+    y0 = max(0, int(point[0]) - radius)
+    y1 = min(h, int(point[0]) + radius + 1)
+    x0 = max(0, int(point[1]) - radius)
+    x1 = min(w, int(point[1]) + radius + 1)
+    return y0, y1, x0, x1
+
+def search_cost_bounded(data, start, radius, goal=None, max_expansions=None, occupancy=None):
+    """
+    startを中心に上下左右radiusマスの窓の中だけで歩数を求める
+    窓の外は見ないので、地図の大きさによらずO(radius^2)
+    窓の中の歩数と、窓の左上の位置(y0, x0)を返す
+    """
+    y0, y1, x0, x1 = get_window(data.shape, start, radius)
+    local_start = (int(start[0]) - y0, int(start[1]) - x0)
+    local_goal = (int(goal[0]) - y0, int(goal[1]) - x0) if goal is not None else None
+    occ = occupancy[y0:y1, x0:x1] if occupancy is not None else None
+    barrier = get_barrier(data[y0:y1, x0:x1], local_start, local_goal or local_start, occupancy=occ)
+    cost = search_cost_bfs(barrier, local_start, goal=local_goal, max_expansions=max_expansions)
+    return cost, (y0, x0)
+
+def search_bounded(data, start, goal, radius, max_expansions=None, occupancy=None):
+    """
+    startから上下左右radiusマスの窓の中だけで最短経路を探す
+    窓を出ないと行けない場合や、max_expansionsマス展開しても着かない場合はNone
+    """
+    y0, y1, x0, x1 = get_window(data.shape, start, radius)
+    if not (y0 <= goal[0] < y1 and x0 <= goal[1] < x1):
+        return None
+    cost, origin = search_cost_bounded(data, start, radius, goal=goal, max_expansions=max_expansions, occupancy=occupancy)
+    route = backtrack(cost, (int(goal[0]) - origin[0], int(goal[1]) - origin[1]))
+    if route is None:
+        return None
+    return [(y + origin[0], x + origin[1]) for y, x in route]
+
+def search_many(data, starts, goals, occupancy=None):
+    """
+    複数キャラの経路をまとめて探す
+    goalが同じキャラはgoalからの歩数を1回だけ求めて、それぞれのstartからたどる
+    startが同じキャラはstartからの歩数を1回だけ求めて、それぞれのgoalから戻る
+    どちらも1体だけならsearch_bfsと同じ
+    occupancyのマスは、キャラごとに自分のstart, goalしか通れない(get_barrierを1体ずつ使うのと同じ)
+
+    starts = [(y, x), ...]
+    goals = [(y, x), ...]
+    starts, goalsと同じ順に経路を返す. 到達できなければNone
+    """
+    starts = [(int(s[0]), int(s[1])) for s in starts]
+    goals = [(int(g[0]), int(g[1])) for g in goals]
+    routes = [None] * len(starts)
+
+    by_start = {}
+    by_goal = {}
+    for i, (s, g) in enumerate(zip(starts, goals)):
+        by_start.setdefault(s, []).append(i)
+        by_goal.setdefault(g, []).append(i)
+
+    # 大きいグループから順に1回ずつ探索する. 同じ大きさならstartでまとめる
+    groups = [(len(v), 0, k, v) for k, v in by_start.items()] + [(len(v), 1, k, v) for k, v in by_goal.items()]
+    groups.sort(key=lambda e: (-e[0], e[1]))
+    done = set()
+    for _, by_goal_group, point, idxs in groups:
+        idxs = [i for i in idxs if i not in done]
+        if len(idxs) == 0:
+            continue
+        ends = [starts[i] for i in idxs] if by_goal_group else [goals[i] for i in idxs]
+        barrier = get_barrier(data, point, point, occupancy=occupancy)
+        # キャラのいるマスなど塞がれた端点は、そのキャラ自身の経路の端にだけなれる
+        # ほかのキャラの経路が通り抜けないように、コストはつけるが先へは広げない
+        terminals = [p for p in set(ends) if barrier[p] and p != point]
+        cost = search_cost_bfs(barrier, point, goals=ends, terminals=terminals)
+        terminal_costs = {p: cost[p] for p in terminals}
+        for p in terminals:
+            cost[p] = UNREACHABLE
+        for i, p in zip(idxs, ends):
+            # 自分の端点だけコストを戻してたどる
+            if p in terminal_costs:
+                cost[p] = terminal_costs[p]
+            routes[i] = descend(cost, p) if by_goal_group else backtrack(cost, p)
+            if p in terminal_costs:
+                cost[p] = UNREACHABLE
+        done.update(idxs)
+
+    return routes
+
+def search_many_bounded(data, starts, goals, center, radius, occupancy=None):
+    """
+    centerを中心に上下左右radiusマスの窓の中だけでsearch_manyをする
+    窓の外にstartかgoalがあるキャラや、窓を出ないと行けないキャラはNone
+    """
+    y0, y1, x0, x1 = get_window(data.shape, center, radius)
+    inside = [y0 <= s[0] < y1 and x0 <= s[1] < x1 and y0 <= g[0] < y1 and x0 <= g[1] < x1
+              for s, g in zip(starts, goals)]
+    idxs = [i for i, e in enumerate(inside) if e]
+    routes = [None] * len(starts)
+    if len(idxs) == 0:
+        return routes
+    occ = occupancy[y0:y1, x0:x1] if occupancy is not None else None
+    local = search_many(data[y0:y1, x0:x1],
+                        [(int(starts[i][0]) - y0, int(starts[i][1]) - x0) for i in idxs],
+                        [(int(goals[i][0]) - y0, int(goals[i][1]) - x0) for i in idxs],
+                        occupancy=occ)
+    for i, route in zip(idxs, local):
+        if route is not None:
+            routes[i] = [(y + y0, x + x0) for y, x in route]
+    return routes
+
+def search_shortest_path(barrier, start, goal, method="bfs"):
+    """
+    method = "bfs" or "astar"
+    """
+    if method == "bfs":
+        return search_bfs(barrier, start, goal)
+    elif method == "astar":
+        return search_astar(barrier, start, goal)
+    else:
+        raise ValueError(f"unknown method: {method}")
+
+class PathCache:
+    """
+    search_shortest_pathの結果を覚えておくLRUキャッシュ
+    地図のversionが変わったら全て捨てる
+    occupancyが与えられれば、経路上(start, goalを除く)にキャラが来た経路も捨てる
+    ただしキャラがいなくなって近道ができた場合は捨てない
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.version = None
+        self.routes = OrderedDict() # key: (route, ys, xs)
+
+        # キャッシュの大きさを決める用のカウンタ
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0 # maxsizeを超えて捨てた数
+        self.invalidations = 0 # 地図やoccupancyの変化で捨てた数
+
+    def get(self, key, version, occupancy=None):
+        if version != self.version:
+            self.invalidations += len(self.routes)
+            self.routes.clear()
+            self.version = version
+
+        item = self.routes.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        route, ys, xs = item
+        if occupancy is not None and np.any(occupancy[ys, xs]):
+            del self.routes[key]
+            self.invalidations += 1
+            self.misses += 1
+            return None
+
+        self.routes.move_to_end(key)
+        self.hits += 1
+        return route
+
+    def put(self, key, route):
+        inner = np.array(route[1:-1], dtype=int).reshape(-1, 2)
+        self.routes[key] = (route, inner[:, 0], inner[:, 1])
+        self.routes.move_to_end(key)
+        while len(self.routes) > self.maxsize:
+            self.routes.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.routes.clear()
+
+    def cache_info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self.routes),
+            "maxsize": self.maxsize,
+        }
+
+class RoomGraph:
+    """
+    部屋ごとに区切った地図の上で経路を探す (HPA*)
+    区切りの境界をまたぐ通路の入口を節点、同じ部屋の中での歩数を枝にしたグラフを先につくっておく
+    探索ではまずグラフ上で経路を探し、通る部屋の中だけ細かい経路を求める
+    経路は最短とは限らない
+
+    barrier: 走行不可のマスがTrue (occupancyは含めない)
+    row_idx, col_idx: 部屋の区切りの位置. create_map_dungeonのrand_row_idx, rand_col_idx
+    """
+    def __init__(self, barrier, row_idx, col_idx):
+        self.barrier = barrier
+        h, w = barrier.shape
+        self.row_idx = sorted(set([0, h] + [int(e) for e in row_idx if 0 < e < h]))
+        self.col_idx = sorted(set([0, w] + [int(e) for e in col_idx if 0 < e < w]))
+
+        self.nodes = [] # 入口のマス (y, x)
+        self.node_ids = {} # (y, x) -> 節点番号
+        self.cluster_nodes = {} # (ir, ic) -> [節点番号]
+        self.edges = [] # 節点番号 -> {節点番号: 歩数}
+
+        self._find_entrances()
+        self._connect_in_clusters()
+
+    def get_cluster(self, point):
+        ir = bisect_right(self.row_idx, point[0]) - 1
+        ic = bisect_right(self.col_idx, point[1]) - 1
+        return (ir, ic)
+
+    def _add_node(self, point):
+        if point not in self.node_ids:
+            self.node_ids[point] = len(self.nodes)
+            self.nodes.append(point)
+            self.edges.append({})
+            self.cluster_nodes.setdefault(self.get_cluster(point), []).append(self.node_ids[point])
+        return self.node_ids[point]
+
+    def _add_entrances(self, pairs):
+        """
+        境界をはさんで隣り合う通路のマスの組のうち、連続した区間ごとに真ん中の1組を入口とする
+        """
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and not self.barrier[pair[0]] and not self.barrier[pair[1]]:
+                run.append(pair)
+                continue
+            if len(run) > 0:
+                a, b = run[len(run) // 2]
+                ia = self._add_node(a)
+                ib = self._add_node(b)
+                self.edges[ia][ib] = 1
+                self.edges[ib][ia] = 1
+                run = []
+
+    def _find_entrances(self):
+        # 縦の境界
+        for x in self.col_idx[1:-1]:
+            for y0, y1 in zip(self.row_idx[:-1], self.row_idx[1:]):
+                self._add_entrances([((y, x - 1), (y, x)) for y in range(y0, y1)])
+        # 横の境界
+        for y in self.row_idx[1:-1]:
+            for x0, x1 in zip(self.col_idx[:-1], self.col_idx[1:]):
+                self._add_entrances([((y - 1, x), (y, x)) for x in range(x0, x1)])
+
+    def _get_cluster_barrier(self, cluster, points=()):
+        ir, ic = cluster
+        y0, x0 = self.row_idx[ir], self.col_idx[ic]
+        barrier = self.barrier[y0:self.row_idx[ir + 1], x0:self.col_idx[ic + 1]].copy()
+        for p in points:
+            barrier[p[0] - y0, p[1] - x0] = False
+        return barrier, (y0, x0)
+
+    def _get_costs_in_cluster(self, cluster, point):
+        """
+        pointから同じ部屋の入口までの歩数 {節点番号: 歩数}
+        """
+        barrier, (y0, x0) = self._get_cluster_barrier(cluster, [point])
+        cost = search_cost_bfs(barrier, (point[0] - y0, point[1] - x0))
+        costs = {}
+        for i in self.cluster_nodes.get(cluster, []):
+            c = cost[self.nodes[i][0] - y0, self.nodes[i][1] - x0]
+            if c != UNREACHABLE:
+                costs[i] = int(c)
+        return costs
+
+    def _connect_in_clusters(self):
+        for cluster, ids in self.cluster_nodes.items():
+            for i in ids:
+                for j, c in self._get_costs_in_cluster(cluster, self.nodes[i]).items():
+                    if j != i:
+                        self.edges[i][j] = c
+
+    def _search_in_cluster(self, cluster, start, goal):
+        barrier, (y0, x0) = self._get_cluster_barrier(cluster, [start, goal])
+        route = search_bfs(barrier, (start[0] - y0, start[1] - x0), (goal[0] - y0, goal[1] - x0))
+        if route is None:
+            return None
+        return [(y + y0, x + x0) for y, x in route]
+
+    def search(self, start, goal):
+        """
+        start = (y, x)
+        goal = (y, x)
+        goalに到達できなければNone
+        """
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+        start_cluster = self.get_cluster(start)
+        goal_cluster = self.get_cluster(goal)
+
+        # 同じ部屋の中で行けるならグラフは使わない
+        if start_cluster == goal_cluster:
+            route = self._search_in_cluster(start_cluster, start, goal)
+            if route is not None:
+                return route
+
+        # start, goalを一時的な節点としてグラフにつなぐ. 番号はそれぞれ-1, -2
+        start_costs = self._get_costs_in_cluster(start_cluster, start)
+        goal_costs = self._get_costs_in_cluster(goal_cluster, goal)
+
+        # グラフ上のA*
+        START, GOAL = -1, -2
+        cost = {START: 0}
+        came_from = {START: None}
+        open_list = [(0, START)]
+        while open_list:
+            _, i = heapq.heappop(open_list)
+            if i == GOAL:
+                break
+            neighbors = start_costs if i == START else self.edges[i]
+            candidates = list(neighbors.items())
+            if i in goal_costs:
+                candidates.append((GOAL, goal_costs[i]))
+            for j, c in candidates:
+                c = cost[i] + c
+                if c < cost.get(j, UNREACHABLE):
+                    cost[j] = c
+                    came_from[j] = i
+                    p = goal if j == GOAL else self.nodes[j]
+                    heapq.heappush(open_list, (c + abs(goal[0] - p[0]) + abs(goal[1] - p[1]), j))
+
+        if GOAL not in came_from:
+            return None
+
+        abstract_route = []
+        i = GOAL
+        while i is not None:
+            abstract_route.append(goal if i == GOAL else start if i == START else self.nodes[i])
+            i = came_from[i]
+        abstract_route = abstract_route[::-1]
+
+        # 通る部屋の中だけ細かい経路を求める
+        route = [start]
+        for p, q in zip(abstract_route[:-1], abstract_route[1:]):
+            cluster = self.get_cluster(p)
+            if cluster != self.get_cluster(q): # 境界をまたぐ
+                route.append(q)
+            else:
+                route.extend(self._search_in_cluster(cluster, p, q)[1:])
+        return route
+
+class DStarLite:
+    """
+    D* Lite による経路の再計画
+    goalからの歩数を覚えておき、occupancyが変わったマスのまわりだけ探索し直す
+    キャラごとに1つ持たせて、塞がれたらreplanを呼ぶ
+
+    walls: 壁がTrue
+    start = (y, x)
+    goal = (y, x)
+    occupancy: キャラがいるマスがTrue. start, goalは障害物としない
+    occupancy_version: occupancyの版. 次のreplanに変わったマスを渡すときの起点にする
+    """
+    def __init__(self, walls, start, goal, occupancy=None, occupancy_version=None):
+        self.walls = walls
+        self.occupancy_version = occupancy_version
+        self.h, self.w = walls.shape
+        self.start = (int(start[0]), int(start[1]))
+        self.goal = (int(goal[0]), int(goal[1]))
+        self.last = self.start
+        self.km = 0
+
+        self.blocked = self._get_blocked(occupancy)
+        self.free = (~self.blocked).ravel().tolist()
+        size = self.h * self.w
+        self.g = [float("inf")] * size
+        self.rhs = [float("inf")] * size
+        self.open_list = [] # (k1, k2, idx)
+        self.open_key = {} # idx -> (k1, k2) 古い要素はopen_listに残ったまま無視する
+
+        g = self._get_idx(self.goal)
+        self.rhs[g] = 0
+        self._push(g)
+        self._compute()
+
+    def _get_idx(self, point):
+        return point[0] * self.w + point[1]
+
+    def _get_blocked(self, occupancy):
+        blocked = self.walls.copy() if occupancy is None else self.walls | occupancy
+        blocked[self.start] = False
+        blocked[self.goal] = False
+        return blocked
+
+    def _get_neighbors(self, idx):
+        y, x = divmod(idx, self.w)
+        neighbors = []
+        if y > 0:
+            neighbors.append(idx - self.w)
+        if y < self.h - 1:
+            neighbors.append(idx + self.w)
+        if x > 0:
+            neighbors.append(idx - 1)
+        if x < self.w - 1:
+            neighbors.append(idx + 1)
+        return neighbors
+
+    def _get_key(self, idx):
+        m = min(self.g[idx], self.rhs[idx])
+        y, x = divmod(idx, self.w)
+        return (m + abs(y - self.start[0]) + abs(x - self.start[1]) + self.km, m)
+
+    def _push(self, idx):
+        key = self._get_key(idx)
+        self.open_key[idx] = key
+        heapq.heappush(self.open_list, (key[0], key[1], idx))
+
+    def _get_top(self):
+        while self.open_list:
+            k1, k2, idx = self.open_list[0]
+            if self.open_key.get(idx) == (k1, k2):
+                return (k1, k2), idx
+            heapq.heappop(self.open_list)
+        return None, None
+
+    def _update_vertex(self, idx):
+        if idx != self._get_idx(self.goal):
+            rhs = float("inf")
+            if self.free[idx]:
+                for n in self._get_neighbors(idx):
+                    if self.free[n] and self.g[n] + 1 < rhs:
+                        rhs = self.g[n] + 1
+            self.rhs[idx] = rhs
+        if self.g[idx] != self.rhs[idx]:
+            self._push(idx)
+        else:
+            self.open_key.pop(idx, None)
+
+    def _compute(self):
+        s = self._get_idx(self.start)
+        while True:
+            k_old, idx = self._get_top()
+            if idx is None:
+                break
+            if not (k_old < self._get_key(s) or self.rhs[s] != self.g[s]):
+                break
+
+            heapq.heappop(self.open_list)
+            k_new = self._get_key(idx)
+            if k_old < k_new:
+                self._push(idx)
+            elif self.g[idx] > self.rhs[idx]:
+                del self.open_key[idx]
+                self.g[idx] = self.rhs[idx]
+                for n in self._get_neighbors(idx):
+                    self._update_vertex(n)
+            else:
+                del self.open_key[idx]
+                self.g[idx] = float("inf")
+                self._update_vertex(idx)
+                for n in self._get_neighbors(idx):
+                    self._update_vertex(n)
+
+    def replan(self, start, occupancy=None, changed=None, occupancy_version=None):
+        """
+        startに移動して、occupancyが前回から変わったマスだけ探索し直した経路を返す
+        goalに到達できなければNone
+        changed: 前回からoccupancyが変わったマス[(y, x), ...]. Noneなら地図全体を比べて探す
+        occupancy_version: 今のoccupancyの版. 次のchangedの起点として覚えておく
+        """
+        start = (int(start[0]), int(start[1]))
+        self.km += abs(start[0] - self.last[0]) + abs(start[1] - self.last[1])
+        prev = self.start
+        self.last = start
+        self.start = start
+        self.occupancy_version = occupancy_version
+
+        if changed is None:
+            blocked = self._get_blocked(occupancy)
+            cells = zip(*np.nonzero(blocked != self.blocked))
+        else:
+            # startは障害物としないので、前のstartと今のstartも見直す
+            cells = set((int(y), int(x)) for y, x in changed) | {prev, start}
+        for y, x in cells:
+            is_blocked = bool(self.walls[y, x] or (occupancy is not None and occupancy[y, x]))
+            is_blocked = is_blocked and (y, x) != self.start and (y, x) != self.goal
+            idx = y * self.w + x
+            if self.free[idx] != is_blocked:
+                continue
+            self.free[idx] = not is_blocked
+            self.blocked[y, x] = is_blocked
+            self._update_vertex(idx)
+            for n in self._get_neighbors(idx):
+                self._update_vertex(n)
+
+        self._compute()
+        return self.get_route()
+
+    def get_route(self):
+        """
+        goalまでの歩数が減る方へたどった経路. goalに到達できなければNone
+        """
+        idx = self._get_idx(self.start)
+        g = self._get_idx(self.goal)
+        if self.rhs[idx] == float("inf"):
+            return None
+
+        route = [self.start]
+        while idx != g:
+            best = None
+            best_cost = float("inf")
+            for n in self._get_neighbors(idx):
+                if self.free[n] and self.g[n] + 1 < best_cost:
+                    best = n
+                    best_cost = self.g[n] + 1
+            if best is None:
+                return None
+            idx = best
+            route.append(divmod(idx, self.w))
+        return route
+
+# マスのまわり8マスを一周する順. となり合うものどうしは上下左右でつながっている
+RING = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+class Reachability:
+    """
+    連結成分のラベルでstartからgoalに行けるかをO(1)で調べる
+    行けないときに探索を最後まで回さなくて済む
+    壁だけのラベルは地図が変わるまで使い回す(地図のversionごとにつくり直す)
+    occupancyを与えたときは、壁だけで行けるときに限り、occupancyも塞いだラベルを引く
+    そのラベルは最初に一度つけたあと、occupancyが変わったマスのまわりだけ直す
+        空いたマス: となりのラベルを併合する(parentでつなぐ)
+        塞いだマス: 分かれたかもしれないときだけ、各方向から同時に塗っていき
+                   先に塗り終わった側(小さい方)に新しいラベルをつける
+
+    walls: 壁がTrue
+    """
+    def __init__(self, walls):
+        self.walls = walls
+        self.labels, _ = label(~walls)
+        self.occupied_labels = None
+        self.parent = None # occupied_labelsのラベル -> 併合した先のラベル
+        self.occupancy_version = None
+
+    def update(self, occupancy, occupancy_version, changed=None):
+        """
+        occupancy_version: occupancyを書きかえるたびに変わる値. 前回と同じなら何もしない
+        changed: 前回からoccupancyが変わったマス[(y, x), ...]. Noneならラベルをつけ直す
+        """
+        if self.occupied_labels is not None and occupancy_version == self.occupancy_version:
+            return
+        if self.occupied_labels is None or changed is None:
+            self.occupied_labels, num = label(~(self.walls | occupancy))
+            self.parent = list(range(num + 1))
+        else:
+            for yx in changed:
+                y, x = int(yx[0]), int(yx[1])
+                if self.walls[y, x]:
+                    continue
+                if occupancy[y, x]:
+                    self._block(y, x)
+                else:
+                    self._unblock(y, x)
+        self.occupancy_version = occupancy_version
+
+    def _find(self, l):
+        parent = self.parent
+        root = l
+        while parent[root] != root:
+            root = parent[root]
+        while parent[l] != root:
+            parent[l], l = root, parent[l]
+        return root
+
+    def _new_label(self):
+        l = len(self.parent)
+        self.parent.append(l)
+        return l
+
+    def _get_free_neighbors(self, y, x):
+        labels = self.occupied_labels
+        h, w = labels.shape
+        return [(ny, nx) for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1))
+                if 0 <= ny < h and 0 <= nx < w and labels[ny, nx] > 0]
+
+    def _unblock(self, y, x):
+        """
+        (y, x)が空いた. となりの成分とつなぐ
+        """
+        labels = self.occupied_labels
+        if labels[y, x] > 0:
+            return
+        roots = {self._find(int(labels[n])) for n in self._get_free_neighbors(y, x)}
+        if not roots:
+            labels[y, x] = self._new_label()
+            return
+        root = roots.pop()
+        for r in roots:
+            self.parent[r] = root
+        labels[y, x] = root
+
+    def _get_ring_groups(self, y, x, neighbors):
+        """
+        まわり8マスを一周して、空いたマスでつながっている上下左右のマスをまとめる
+        1つにまとまれば(y, x)を塞いでも成分は分かれない
+        """
+        labels = self.occupied_labels
+        h, w = labels.shape
+        free = [0 <= y + dy < h and 0 <= x + dx < w and labels[y + dy, x + dx] > 0 for dy, dx in RING]
+        if all(free):
+            return [neighbors]
+        # 空いていないマスから数えはじめて、空いたマスの並びごとに分ける
+        first = free.index(False)
+        groups = []
+        run = None
+        for k in range(first, first + len(RING)):
+            k %= len(RING)
+            if not free[k]:
+                run = None
+                continue
+            if run is None:
+                run = []
+                groups.append(run)
+            if k % 2 == 1: # 上下左右
+                run.append((y + RING[k][0], x + RING[k][1]))
+        return [g for g in groups if g]
+
+    def _block(self, y, x):
+        """
+        (y, x)が塞がった. 成分が分かれたときは小さい方から塗り直す
+        """
+        labels = self.occupied_labels
+        if labels[y, x] == 0:
+            return
+        labels[y, x] = 0
+        neighbors = self._get_free_neighbors(y, x)
+        if len(neighbors) <= 1:
+            return
+        groups = self._get_ring_groups(y, x, neighbors)
+        if len(groups) <= 1:
+            return
+
+        # 各方向から1マスずつ順に塗る. 出会ったら1つにまとめ, 塗り終わったものは別の成分
+        h, w = labels.shape
+        seeds = [g[0] for g in groups]
+        owner = {seed: i for i, seed in enumerate(seeds)}
+        merged = list(range(len(seeds)))
+        cells = [[seed] for seed in seeds]
+        queues = [deque([seed]) for seed in seeds]
+        active = list(range(len(seeds)))
+
+        def find(i):
+            while merged[i] != i:
+                i = merged[i]
+            return i
+
+        while len(active) > 1:
+            for i in list(active):
+                if i not in active:
+                    continue
+                if not queues[i]:
+                    # 塗り終わった. ほかと出会わなかったので別の成分
+                    active.remove(i)
+                    l = self._new_label()
+                    ys, xs = zip(*cells[i])
+                    labels[ys, xs] = l
+                    if len(active) <= 1:
+                        break
+                    continue
+                cy, cx = queues[i].popleft()
+                for n in ((cy - 1, cx), (cy + 1, cx), (cy, cx - 1), (cy, cx + 1)):
+                    if not (0 <= n[0] < h and 0 <= n[1] < w) or labels[n] == 0:
+                        continue
+                    o = owner.get(n)
+                    if o is None:
+                        owner[n] = i
+                        cells[i].append(n)
+                        queues[i].append(n)
+                        continue
+                    j = find(o)
+                    if j != i:
+                        merged[j] = i
+                        cells[i].extend(cells[j])
+                        queues[i].extend(queues[j])
+                        active.remove(j)
+                if len(active) <= 1:
+                    break
+        # 最後まで残ったものは元のラベルのまま
+
+    def _get_labels(self, labels, point, find=None):
+        """
+        pointとその上下左右のラベル. start, goalはキャラがいても通れるものとして扱うため
+        find: 併合したラベルをたどる関数
+        """
+        h, w = labels.shape
+        found = set()
+        for dy, dx in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+            y = point[0] + dy
+            x = point[1] + dx
+            if 0 <= y < h and 0 <= x < w and labels[y, x] > 0:
+                l = int(labels[y, x])
+                found.add(l if find is None else find(l))
+        return found
+
+    def is_reachable(self, start, goal, occupancy=None, occupancy_version=None, changed=None):
+        """
+        start = (y, x)
+        goal = (y, x)
+        occupancy: キャラのいるマスがTrue. Noneなら壁だけを見る
+        occupancy_version: occupancyを書きかえるたびに変わる値. Noneならoccupancyを毎回ラベルづけする
+        changed: occupancy_versionが前回の値から変わるまでに書きかえたマス. Noneならラベルをつけ直す
+        """
+        if abs(int(start[0]) - int(goal[0])) + abs(int(start[1]) - int(goal[1])) <= 1:
+            return True
+        # 壁だけで行けなければ、キャラがいてもいなくても行けない
+        if not self._get_labels(self.labels, start) & self._get_labels(self.labels, goal):
+            return False
+        if occupancy is None:
+            return True
+        if occupancy_version is None:
+            self.occupied_labels = None
+        self.update(occupancy, occupancy_version, changed)
+        labels = self.occupied_labels
+        return len(self._get_labels(labels, start, self._find) & self._get_labels(labels, goal, self._find)) > 0
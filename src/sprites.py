@@ -0,0 +1,117 @@
+"""
+タイルやキャラのbltの引数を前もって表にしておき、描くときは表を引くだけにする
+if/elifでタイルの種類や向きを調べなくてよくなる
+
+    self.tile_table = TileTable(get_tile_locs(get_tile_loc, TyleType))
+    self.walk_sprite = Sprite(WALK_FRAMES, colkey=0)
+    ...
+    self.tile_table.draw(self.tile_info_map) # 画面のタイルをまとめて描く
+    self.walk_sprite.draw(x, y, self.ego.d, self.tick, 96, 64)
+"""
+import numpy as np
+import pyxel
+
+# タイルの番号(autotileの値) -> TyleTypeの名前
+TILE_NAMES = {
+    1: "WALL_IN_UP",
+    2: "WALL_IN_DOWN",
+    3: "WALL_IN_LEFT",
+    4: "WALL_IN_RIGHT",
+    5: "WALL_IN_UL_CORNER",
+    6: "WALL_IN_DL_CORNER",
+    7: "WALL_IN_UR_CORNER",
+    8: "WALL_IN_DR_CORNER",
+    9: "WALL_OUT_UP",
+    10: "WALL_OUT_DOWN",
+    11: "WALL_OUT_LEFT",
+    12: "WALL_OUT_RIGHT",
+    13: "WALL_OUT_UL_CORNER",
+    14: "WALL_OUT_DL_CORNER",
+    15: "WALL_OUT_UR_CORNER",
+    16: "WALL_OUT_DR_CORNER",
+    23: "GOAL",
+}
+
+def get_tile_locs(get_tile_loc, tile_types):
+    """
+    get_tile_locを一度ずつ呼んで {タイルの番号: (u, v)} にする
+    tile_typesにない名前や、get_tile_locがNoneを返すものは入れない(描かない)
+    """
+    locs = {}
+    for number, name in TILE_NAMES.items():
+        if not hasattr(tile_types, name):
+            continue
+        loc = get_tile_loc(getattr(tile_types, name))
+        if loc is not None:
+            locs[number] = tuple(loc)
+    return locs
+
+class TileTable:
+    def __init__(self, locs, img=0, size=16, colkey=None):
+        """
+        locs: {タイルの番号(0~255): (u, v)}. ないものは描かない
+        colkey: Noneなら透明色なしでbltする
+        """
+        self.img = img
+        self.size = size
+        self.has = np.zeros(256, dtype=bool)
+        self.u = np.zeros(256, dtype=np.int32)
+        self.v = np.zeros(256, dtype=np.int32)
+        for number, (u, v) in locs.items():
+            self.has[number] = True
+            self.u[number] = u
+            self.v[number] = v
+        # bltの最後の引数
+        self.tail = (size, size) if colkey is None else (size, size, colkey)
+
+    def get_blits(self, tiles, x=0, y=0):
+        """
+        tiles(h, w)を(x, y)から並べて描くときのbltの引数 [(x, y, img, u, v, w, h[, colkey]), ...]
+        描かないマスは入れない
+        """
+        tiles = np.asarray(tiles)
+        js, is_ = np.nonzero(self.has[tiles])
+        numbers = tiles[js, is_]
+        xs = (x + is_ * self.size).tolist()
+        ys = (y + js * self.size).tolist()
+        us = self.u[numbers].tolist()
+        vs = self.v[numbers].tolist()
+        img, tail = self.img, self.tail
+        return [(bx, by, img, u, v) + tail for bx, by, u, v in zip(xs, ys, us, vs)]
+
+    def draw(self, tiles, x=0, y=0):
+        """
+        1レイヤー分のタイルをまとめて描く. 表を引くのは配列全体で一度だけ
+        """
+        blt = pyxel.blt
+        for args in self.get_blits(tiles, x, y):
+            blt(*args)
+
+class Sprite:
+    def __init__(self, frames, img=0, colkey=None):
+        """
+        frames: {向き: [(u, v, w, h), ...]}. 向きごとにコマ数が違ってもよい
+            wやhを負にすると反転して描く
+        colkey: Noneなら透明色なしでbltする
+        """
+        self.img = img
+        self.colkey = colkey
+        self.frames = {d: tuple(tuple(f) for f in fs) for d, fs in frames.items()}
+
+    def get_blit(self, x, y, d, tick, du=0, dv=0):
+        """
+        向きdのtick番目のコマを(x, y)に描くときのbltの引数. framesにない向きならNone
+        du, dv: framesのu, vに足す. 同じ並びで色違いのキャラに使う
+        """
+        frames = self.frames.get(d)
+        if frames is None:
+            return None
+        u, v, w, h = frames[tick % len(frames)]
+        if self.colkey is None:
+            return (x, y, self.img, u + du, v + dv, w, h)
+        return (x, y, self.img, u + du, v + dv, w, h, self.colkey)
+
+    def draw(self, x, y, d, tick, du=0, dv=0):
+        args = self.get_blit(x, y, d, tick, du, dv)
+        if args is not None:
+            pyxel.blt(*args)
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+
+import numpy as np
+
+import dungeon
+
+def get_overlaps(size, y0, y1, x0, x1):
+    """
+    [y0, y1) x [x0, x1)と重なるチャンクごとに
+    (cy, cx, 窓の中の範囲(slice, slice), チャンクの中の範囲(slice, slice)) を返す
+    """
+    for cy in range(y0 // size, (y1 - 1) // size + 1):
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            oy0 = max(y0, cy * size)
+            oy1 = min(y1, (cy + 1) * size)
+            ox0 = max(x0, cx * size)
+            ox1 = min(x1, (cx + 1) * size)
+            yield (cy, cx,
+                   (slice(oy0 - y0, oy1 - y0), slice(ox0 - x0, ox1 - x0)),
+                   (slice(oy0 - cy * size, oy1 - cy * size), slice(ox0 - cx * size, ox1 - cx * size)))
+
+class ChunkView:
+    """
+    world.data[y, x] で地図を読めるようにする
+    0: 走行可能
+    1: 走行不可
+    """
+    def __init__(self, world):
+        self.world = world
+
+    def __getitem__(self, yx):
+        y, x = int(yx[0]), int(yx[1])
+        size = self.world.chunk_size
+        chunk = self.world.get_chunk(y // size, x // size)
+        return int(chunk[y % size, x % size])
+
+class ChunkedWorld:
+    """
+    地図をchunk_size x chunk_sizeのチャンクに分けて、読まれたときにはじめてつくる
+    各チャンクはseedとチャンクの位置から決まる乱数でつくるので、捨ててもつくり直せば同じになる
+    max_chunksより多くなったら最近使っていないものから捨てる
+    メモリはおよそ max_chunks * chunk_size^2 [byte]で、地図の広さによらない
+
+    座標は(y, x)で、負の値も含めて上下左右どこまでも続く
+    隣り合うチャンクは境界上の同じ位置から通路を引いてつなぐ
+    チャンクの中身は読み取り専用. 書きかえても捨てられたら元に戻る
+    """
+    def __init__(self, chunk_size=64, seed=0, max_chunks=64,
+                 num_col_rooms=2,
+                 num_row_rooms=2,
+                 min_room_size_ratio=0.3,
+                 max_room_size_ratio=0.8
+                 ):
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.max_chunks = max_chunks
+        self.num_col_rooms = num_col_rooms
+        self.num_row_rooms = num_row_rooms
+        self.min_room_size_ratio = min_room_size_ratio
+        self.max_room_size_ratio = max_room_size_ratio
+
+        self.chunks = OrderedDict() # (cy, cx) -> np.uint8 (chunk_size, chunk_size)
+        self.data = ChunkView(self)
+
+        # get_free_spaceで使う
+        self.rng = np.random.default_rng(seed)
+
+        # 何回つくって何回捨てたか
+        self.generated = 0
+        self.evicted = 0
+
+    def _get_rng(self, *keys):
+        """
+        seedとkeysから決まる乱数. 負の座標も使えるように2^32で割った余りにする
+        """
+        entropy = [self.seed % 2**32] + [k % 2**32 for k in keys]
+        return np.random.default_rng(entropy)
+
+    def _get_edge_position(self, kind, cy, cx):
+        """
+        チャンク(cy, cx)の下(kind=0)か右(kind=1)の境界で通路を通す位置
+        隣のチャンクからも同じ位置になる
+        """
+        return self._get_rng(kind, cy, cx).integers(1, self.chunk_size - 1)
+
+    def _create_chunk(self, cy, cx):
+        size = self.chunk_size
+        rng = self._get_rng(2, cy, cx)
+        rand_row_idx, rand_col_idx = dungeon.split_rooms(size, size, self.num_col_rooms, self.num_row_rooms)
+        rooms = dungeon.create_rooms(rand_row_idx, rand_col_idx, self.min_room_size_ratio, self.max_room_size_ratio, rng=rng)
+        exits = dungeon.get_exits(len(rand_row_idx)-1, len(rand_col_idx)-1, single_line=False)
+        free = dungeon.draw_rooms((size, size), rooms)
+        free |= dungeon.draw_corridors((size, size), rooms, exits)
+
+        # 上下左右の境界から一番近い通路までL字に線を引いて隣のチャンクとつなぐ
+        ys, xs = np.nonzero(free)
+        edges = [
+            (0, self._get_edge_position(0, cy - 1, cx)), # 上
+            (size - 1, self._get_edge_position(0, cy, cx)), # 下
+            (self._get_edge_position(1, cy, cx - 1), 0), # 左
+            (self._get_edge_position(1, cy, cx), size - 1), # 右
+        ]
+        for ey, ex in edges:
+            i = np.argmin(np.abs(ys - ey) + np.abs(xs - ex))
+            ty, tx = ys[i], xs[i]
+            free[min(ey, ty):max(ey, ty)+1, ex] = True
+            free[ty, min(ex, tx):max(ex, tx)+1] = True
+
+        return (~free).astype(np.uint8)
+
+    def get_chunk(self, cy, cx):
+        key = (cy, cx)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self._create_chunk(cy, cx)
+            self.generated += 1
+            self.chunks[key] = chunk
+            while len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.chunks.move_to_end(key)
+        return chunk
+
+    def get_window(self, y0, y1, x0, x1):
+        """
+        [y0, y1) x [x0, x1)の範囲の地図. 必要なチャンクだけつくる
+        """
+        window = np.empty((y1 - y0, x1 - x0), dtype=np.uint8)
+        for cy, cx, win, part in get_overlaps(self.chunk_size, y0, y1, x0, x1):
+            window[win] = self.get_chunk(cy, cx)[part]
+        return window
+
+    def get_local_data(self, y, x, size=16):
+        """
+        (y, x)を中心にsize x sizeだけ取り出した地図と、その左右上下のマージン
+        地図に端がないので、常に中心になる
+        """
+        l = size // 2
+        r = size - l
+        return self.get_window(y - l, y + r, x - l, x + r), (l, r, l, r)
+
+    def get_free_space(self, num=1, y=0, x=0):
+        """
+        (y, x)を含むチャンクの通路から重ならないようにnumマス選ぶ
+        """
+        size = self.chunk_size
+        cy = y // size
+        cx = x // size
+        ys, xs = np.nonzero(self.get_chunk(cy, cx) == 0)
+        idx = self.rng.choice(len(ys), num, replace=False)
+        return [(int(ys[i]) + cy * size, int(xs[i]) + cx * size) for i in idx]
+
+class ChunkedMask:
+    """
+    ChunkedWorldと同じ座標のbool配列. 見たことのある場所などに使う
+    Trueを書いたチャンクだけ持つので、歩いた範囲の分しかメモリを使わない
+    地図と違ってつくり直せないので捨てない
+    """
+    def __init__(self, chunk_size=64):
+        self.chunk_size = chunk_size
+        self.chunks = {} # (cy, cx) -> bool (chunk_size, chunk_size)
+
+    def set_window(self, y0, y1, x0, x1, value=True):
+        """
+        [y0, y1) x [x0, x1)をvalueにする
+        """
+        size = self.chunk_size
+        for cy, cx, _, part in get_overlaps(size, y0, y1, x0, x1):
+            chunk = self.chunks.get((cy, cx))
+            if chunk is None:
+                if not value:
+                    continue
+                chunk = self.chunks[(cy, cx)] = np.zeros((size, size), dtype=bool)
+            chunk[part] = value
+
+    def get_window(self, y0, y1, x0, x1):
+        window = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+        for cy, cx, win, part in get_overlaps(self.chunk_size, y0, y1, x0, x1):
+            chunk = self.chunks.get((cy, cx))
+            if chunk is not None:
+                window[win] = chunk[part]
+        return window
+
+if __name__ == "__main__":
+
+    import time
+
+    world = ChunkedWorld(chunk_size=64, seed=0, max_chunks=16)
+    yx = world.get_free_space(num=1)[0]
+    local_data, margins = world.get_local_data(*yx, size=48)
+    for row in local_data:
+        print("".join("#" if e else "." for e in row))
+
+    # 遠くまで歩いてもチャンクの数は増えない
+    t = time.time()
+    for i in range(1000):
+        world.get_local_data(yx[0], yx[1] + i * 16)
+    print(f"{time.time() - t:.3f}[s] generated={world.generated} evicted={world.evicted} chunks={len(world.chunks)}")